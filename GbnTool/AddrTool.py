@@ -16,9 +16,28 @@ from GbnTool import binascii, re
 
 
 class MACAddress:
-    def __init__(self, mac_str: str, mac_bytes: bytes):
-        self.mac_str = mac_str
+    """
+    An immutable MAC address, objects are interned by their 6 raw bytes.
+    """
+    __slots__ = ("mac_bytes", "_mac_str")
+    PATTERN = re.compile('^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$')
+    CACHE_SIZE = 1024
+    # 以6字节地址为键的驻留缓存，同一地址总是得到同一个对象
+    _cache = {}
+
+    def __init__(self, mac_str, mac_bytes: bytes):
         self.mac_bytes = mac_bytes
+        self._mac_str = mac_str
+
+    @classmethod
+    def _intern(cls, mac_bytes: bytes, mac_str=None):
+        mac_address = cls._cache.get(mac_bytes)
+        if mac_address is None:
+            if len(cls._cache) >= cls.CACHE_SIZE:
+                cls._cache.clear()
+            mac_address = cls(mac_str, mac_bytes)
+            cls._cache[mac_bytes] = mac_address
+        return mac_address
 
     @classmethod
     def from_str(cls, mac_str: str):
@@ -27,23 +46,28 @@ class MACAddress:
         :param mac_str: MAC address with Hex Format
         :return:
         """
-        pattern = re.compile('^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$')
-        if pattern.match(mac_str):
-            return cls(mac_str, binascii.unhexlify(mac_str.replace(':', '')))
+        if cls.PATTERN.match(mac_str):
+            return cls._intern(binascii.unhexlify(mac_str.replace(':', '')))
         else:
             raise ValueError('Invalid MAC string address')
 
     @classmethod
-    def from_bytes(cls, mac_bytes: bytes):
+    def from_bytes(cls, mac_bytes):
         """
         Create MACAddress object with MAC address with Bytes format.
-        :param mac_bytes: MAC address with bytes Format
+        :param mac_bytes: MAC address with bytes Format, any bytes-like object
         :return:
         """
         # if len(mac_bytes) != 6:
         #     raise ValueError('Invalid MAC bytes address')
-        mac_address_str = binascii.hexlify(mac_bytes).decode('utf-8')
-        return cls(':'.join(mac_address_str[i:i + 2] for i in range(0, 12, 2)), mac_bytes)
+        return cls._intern(bytes(mac_bytes))
+
+    @property
+    def mac_str(self) -> str:
+        # 字符串形式只在需要时生成
+        if self._mac_str is None:
+            self._mac_str = binascii.hexlify(self.mac_bytes, ':').decode('utf-8')
+        return self._mac_str
 
     def to_bytes(self):
         return self.mac_bytes
@@ -52,6 +76,8 @@ class MACAddress:
         return self.mac_bytes
 
     def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
         if not isinstance(other, MACAddress):
             return False
         return self.mac_bytes == other.mac_bytes
@@ -0,0 +1,303 @@
+#   Copyright 2023 Gaozih/Gzh0821 https://github.com/Gzh0821
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from GbnTool import asyncio
+from GbnTool.AddrTool import MACAddress
+from GbnTool.ConfigTool import GbnConfig
+from GbnTool.FileTool import FileReader
+from GbnTool.RandomTool import GbnRandom
+from GbnTool.SessionTool import GbnReceiver, SendSession, new_send_session
+from GbnTool.UdpTool import proc_drop_count, set_buffer_size
+
+
+# 基于asyncio的传输引擎，一个事件循环中可同时运行多个发送与接收会话
+
+class GbnProtocol(asyncio.DatagramProtocol):
+    def __init__(self, engine):
+        """
+        The datagram protocol of the asyncio engine.
+        :param engine: the GbnAsyncEngine to dispatch datagrams to
+        """
+        self.engine = engine
+        self.transport = None
+        self.send_count = 0
+        self.receive_count = 0
+        # 传输层的发送缓冲超过高水位时暂停发送数据帧
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        set_buffer_size(transport.get_extra_info("socket"))
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.engine.resume()
+
+    def datagram_received(self, data: bytes, addr):
+        if data and data[0] not in (GbnConfig.SYNC_FLAG[0], GbnConfig.PROBE_FLAG[0], GbnConfig.RESUME_FLAG[0]):
+            self.receive_count += 1
+        self.engine.receiver.handle(data, addr)
+        self.engine.schedule_ack()
+
+    def error_received(self, exc):
+        GbnConfig.print(f"[WARNING] UDP error: {exc}.")
+
+    def send(self, send_data: bytes, error: bool = True, ack: bool = False, addr=None):
+        """
+        Send data to the destination.
+        :param send_data:
+        :param error:
+        :param ack:
+        :param addr: (ip, port) to send to, default is the destination of the engine
+        :return:
+        """
+        if addr is None:
+            addr = self.engine.dest
+        if error:
+            # 依据概率参数随机产生位错误
+            data = GbnRandom.random_error(send_data)
+            if GbnRandom.keep():
+                # 依据概率参数模拟送达或丢失
+                self.transport.sendto(data, addr)
+            if not ack:
+                self.send_count += 1
+        else:
+            self.transport.sendto(send_data, addr)
+
+    def clear_send_count(self):
+        self.send_count = 0
+
+    def clear_receive_count(self):
+        self.receive_count = 0
+
+    def report_drop(self):
+        """
+        Print the count of datagrams dropped by the kernel if any.
+        The transport buffers the datagrams it can not send at once, so only the receive side can drop.
+        :return:
+        """
+        if self.transport is None:
+            return
+        drop_count = proc_drop_count(self.transport.get_extra_info("socket"))
+        if drop_count:
+            GbnConfig.print(f"[WARNING] Datagrams dropped by the kernel: 0 sent, {drop_count} received.")
+
+
+class AsyncSendTask:
+    """
+    Drive a SendSession with the timers of the event loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, session: SendSession):
+        self.loop = loop
+        self.session = session
+        self.timer = None
+        self.done = loop.create_future()
+
+    def drive(self):
+        """
+        Send what the window allows and arm the retransmission timer.
+        :return:
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.session.finished:
+            if not self.done.done():
+                self.done.set_result(self.session.send_count)
+            return
+        # 发送缓冲已满，由resume_writing重新驱动
+        if self.session.udp_handle.paused:
+            return
+        self.session.pump()
+        time_left = self.session.time_left
+        if time_left is not None:
+            self.timer = self.loop.call_later(time_left, self.drive)
+
+    def on_ack(self, ack_num: int, nak: bool = False):
+        self.session.on_ack(ack_num, nak)
+        self.drive()
+
+    def on_probe(self, size: int):
+        self.session.on_probe(size)
+        self.drive()
+
+    def on_resume(self, offset_list: list):
+        self.session.on_resume(offset_list)
+        self.drive()
+
+    def on_sync(self):
+        self.session.on_sync()
+        self.drive()
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        if not self.done.done():
+            self.done.cancel()
+
+
+class GbnAsyncEngine:
+    def __init__(self):
+        """
+        An asyncio engine hosting many GBN sessions on one UDP endpoint.
+        """
+        self.protocol = None
+        self.transport = None
+        self.receiver = None
+        self.dest = None
+        self.task_dict = {}
+        self.ack_timer = None
+
+    async def open(self, bind_port: int, dest_addr: str, dest_port: int):
+        """
+        Create the UDP endpoint.
+        :param bind_port: local port
+        :param dest_addr: default destination IP
+        :param dest_port: default destination port
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        self.dest = (dest_addr, dest_port)
+        self.transport, self.protocol = await loop.create_datagram_endpoint(
+            lambda: GbnProtocol(self), local_addr=("0.0.0.0", bind_port))
+        self.receiver = GbnReceiver(self.protocol, self.deliver_ack, self.deliver_probe, self.deliver_resume,
+                                    self.deliver_sync)
+        GbnConfig.print(f"[INFO] UDP endpoint bind to port: {bind_port}.")
+        GbnConfig.print(f"[INFO] Destination IP: {dest_addr}:{dest_port}.")
+
+    def deliver_ack(self, src_mac: MACAddress, ack_num: int, nak: bool = False):
+        task = self.task_dict.get(src_mac)
+        if task is not None:
+            task.on_ack(ack_num, nak)
+
+    def deliver_probe(self, src_mac: MACAddress, size: int):
+        task = self.task_dict.get(src_mac)
+        if task is not None:
+            task.on_probe(size)
+
+    def deliver_resume(self, src_mac: MACAddress, offset_list: list):
+        task = self.task_dict.get(src_mac)
+        if task is not None:
+            task.on_resume(offset_list)
+
+    def deliver_sync(self, src_mac: MACAddress):
+        task = self.task_dict.get(src_mac)
+        if task is not None:
+            task.on_sync()
+
+    def resume(self):
+        """
+        Drive all sessions again after the transport resumes writing.
+        :return:
+        """
+        for task in list(self.task_dict.values()):
+            task.drive()
+
+    def schedule_ack(self):
+        """
+        Arm the timer of the delayed ACKs, deadlines set later never come earlier than the armed one.
+        :return:
+        """
+        if self.ack_timer is not None:
+            return
+        time_left = self.receiver.time_left
+        if time_left is not None:
+            self.ack_timer = asyncio.get_running_loop().call_later(time_left, self.flush_ack)
+
+    def flush_ack(self):
+        self.ack_timer = None
+        self.receiver.poll()
+        self.schedule_ack()
+
+    async def send_file(self, dst_mac: MACAddress, file_path: str, dest_addr=None) -> int:
+        """
+        Send a file, many transfers to different MAC addresses may run at the same time.
+        :param dst_mac: destination MAC address
+        :param file_path: file path in system, several files are separated by ';'
+        :param dest_addr: (ip, port) of the receiver, default is the destination of the engine
+        :return: count of the data frames sent
+        """
+        if dst_mac in self.task_dict:
+            raise ValueError(f"A transfer to {dst_mac} is already running")
+        session = new_send_session(self.protocol, dst_mac, FileReader(*file_path.split(';')), dest_addr)
+        task = AsyncSendTask(asyncio.get_running_loop(), session)
+        self.task_dict[dst_mac] = task
+        try:
+            session.start()
+            task.drive()
+            await task.done
+        finally:
+            task.cancel()
+            self.task_dict.pop(dst_mac, None)
+            session.close()
+        GbnConfig.print(f"[INFO] File:{file_path} Send Finish!")
+        return session.send_count
+
+    def close(self):
+        for task in self.task_dict.values():
+            task.cancel()
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+        if self.receiver is not None:
+            self.receiver.close()
+        if self.transport is not None:
+            self.protocol.report_drop()
+            self.transport.close()
+
+    async def run(self) -> int:
+        """
+        Run the engine with the same interaction as SendThread.
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        await self.open(GbnConfig.UDP_PORT, GbnConfig.DEST_IP, GbnConfig.DEST_PORT)
+        GbnConfig.print("[INFO] Async engine start listening...")
+        try:
+            while True:
+                if GbnConfig.TEST_MODE:
+                    dst_mac = GbnConfig.DEST_MAC
+                    GbnConfig.print(f"[INFO] Destination MAC Address(from config):{str(dst_mac)}")
+                    message = GbnConfig.FILE_PATH
+                    GbnConfig.print(f"[INFO] File Path(from config):{message}")
+                else:
+                    message = await loop.run_in_executor(
+                        None, input, "[INPUT] Please input the destination MAC address , or input 0 to exit:")
+                    if message == '0':
+                        return 0
+                    try:
+                        dst_mac = MACAddress.from_str(message)
+                    except ValueError:
+                        GbnConfig.print("[WARNING] Invalid Mac Address!")
+                        continue
+                    message = await loop.run_in_executor(
+                        None, input,
+                        "[INPUT] Please input the file to send (several files separated by ';'), or input 0 to exit:")
+                    if message == '0':
+                        return 0
+                try:
+                    await self.send_file(dst_mac, message)
+                except FileNotFoundError:
+                    GbnConfig.print("[ERROR] Invalid File Name.")
+                    if GbnConfig.TEST_MODE:
+                        return 0
+                    continue
+                if GbnConfig.TEST_MODE:
+                    GbnConfig.print("[INFO] Test Finish!")
+                    return 0
+        finally:
+            self.close()
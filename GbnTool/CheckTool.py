@@ -0,0 +1,155 @@
+#   Copyright 2023 Gaozih/Gzh0821 https://github.com/Gzh0821
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from GbnTool import crcmod, zlib
+
+
+# 校验和工具
+
+class GbnChecksum:
+    """
+    A checksum engine, built once and shared by all frames of a session.
+    """
+    CRC_CCITT = 0
+    CRC32 = 1
+    NONE = 2
+    NAME_DICT = {"crc-ccitt": CRC_CCITT, "crc32": CRC32, "none": NONE}
+    # 会话的方向，SEND为本端发送数据的会话，RECEIVE为对端发送数据的会话
+    SEND = 0
+    RECEIVE = 1
+    PREFIX_CACHE_SIZE = 256
+
+    # 已创建的校验引擎，每种算法只创建一次
+    _engine_dict = {}
+    # 与各对端协商好的校验算法，以MAC地址的字节串与会话方向为键，两个方向的会话可以使用不同的算法
+    _peer_dict = {}
+    default = None
+
+    def __init__(self, algorithm: int):
+        """
+        Build the checksum engine.
+        :param algorithm: CRC_CCITT, CRC32 or NONE
+        """
+        self.algorithm = algorithm
+        if algorithm == GbnChecksum.CRC_CCITT:
+            self._func = crcmod.predefined.mkCrcFun('crc-ccitt-false')
+            self.size = 2
+        elif algorithm == GbnChecksum.CRC32:
+            self._func = zlib.crc32
+            self.size = 4
+        elif algorithm == GbnChecksum.NONE:
+            # 可信回环模式，不计算校验和
+            self._func = None
+            self.size = 0
+        else:
+            raise ValueError(f"Unknown checksum algorithm: {algorithm}")
+        self._prefix_dict = {}
+
+    def prefix_value(self, prefix: bytes) -> int:
+        """
+        Get the intermediate checksum value of a frame header prefix, computed once per prefix.
+        :param prefix: header bytes which are the same for every frame of a session
+        :return:
+        """
+        value = self._prefix_dict.get(prefix)
+        if value is None:
+            if len(self._prefix_dict) >= self.PREFIX_CACHE_SIZE:
+                self._prefix_dict.clear()
+            value = self._func(prefix) if self._func is not None else 0
+            self._prefix_dict[prefix] = value
+        return value
+
+    def compute(self, data, prefix: bytes = b"") -> int:
+        """
+        Compute the checksum of prefix + data.
+        :param data: bytes-like object
+        :param prefix: cached header prefix
+        :return:
+        """
+        if self._func is None:
+            return 0
+        if prefix:
+            return self._func(data, self.prefix_value(prefix))
+        return self._func(data)
+
+    def checksum(self, data, prefix: bytes = b"") -> bytes:
+        """
+        Get the checksum trailer of prefix + data.
+        :param data: bytes-like object
+        :param prefix: cached header prefix
+        :return:
+        """
+        if self.size == 0:
+            return b""
+        return self.compute(data, prefix).to_bytes(self.size, byteorder='big')
+
+    def verify(self, frame_bytes) -> bool:
+        """
+        Check the checksum trailer of a whole frame.
+        :param frame_bytes: bytes-like object ends with the checksum
+        :return:
+        """
+        if self.size == 0:
+            return True
+        computed = self._func(frame_bytes[:-self.size])
+        return computed == int.from_bytes(frame_bytes[-self.size:], byteorder='big')
+
+    @staticmethod
+    def get(algorithm: int):
+        """
+        Get the engine of the algorithm, build it only at the first time.
+        :param algorithm:
+        :return:
+        """
+        engine = GbnChecksum._engine_dict.get(algorithm)
+        if engine is None:
+            engine = GbnChecksum(algorithm)
+            GbnChecksum._engine_dict[algorithm] = engine
+        return engine
+
+    @staticmethod
+    def init(name: str):
+        """
+        Init the local checksum algorithm.
+        :param name: "crc-ccitt", "crc32" or "none"
+        :return:
+        """
+        if name not in GbnChecksum.NAME_DICT:
+            raise ValueError(f"Checksum must be one of {', '.join(GbnChecksum.NAME_DICT)}")
+        GbnChecksum.default = GbnChecksum.get(GbnChecksum.NAME_DICT[name])
+
+    @staticmethod
+    def bind(mac_bytes: bytes, algorithm: int, direction: int):
+        """
+        Record the algorithm negotiated with a peer for the sessions of one direction.
+        :param mac_bytes: MAC address of the peer
+        :param algorithm:
+        :param direction: SEND or RECEIVE
+        :return:
+        """
+        GbnChecksum._peer_dict[(bytes(mac_bytes), direction)] = GbnChecksum.get(algorithm)
+
+    @staticmethod
+    def of(mac_bytes: bytes, direction: int):
+        """
+        Get the engine used with a peer, peers that never negotiated use CRC-CCITT.
+        :param mac_bytes: MAC address of the peer
+        :param direction: SEND for the data frames this host sends and the ACKs it receives,
+            RECEIVE for the data frames this host receives and the ACKs it sends
+        :return:
+        """
+        engine = GbnChecksum._peer_dict.get((bytes(mac_bytes), direction))
+        if engine is None:
+            return GbnChecksum.get(GbnChecksum.CRC_CCITT)
+        return engine
@@ -14,6 +14,7 @@
 
 from GbnTool import configparser, math, random, threading
 from GbnTool.AddrTool import MACAddress
+from GbnTool.CheckTool import GbnChecksum
 from GbnTool.LogTool import GbnLog
 from GbnTool.RandomTool import GbnRandom
 from GbnTool.ErrorTool import *
@@ -38,11 +39,50 @@ class GbnConfig:
     FILE_DATA_FLAG = b'\x99'
     FILE_END_FLAG = b'\xbd'
     FILE_NONE_FLAG = b'\xcd'
-    DATA_SIZE = SW_SIZE = SEQ_BIT_SIZE = INIT_SEQ_NO = NO_ACK_NO = None
+    FILE_PACK_FLAG = b'\xa5'  # 打包多个记录的容器
+    FILE_SIZE_FLAG = b'\x8e'  # 文件大小，位于文件名之后
+    FILE_OFFSET_FLAG = b'\x8d'  # 续传的数据偏移，位于文件名之后
+    DATA_SIZE = SW_SIZE = SEQ_BIT_SIZE = SEQ_SPACE = INIT_SEQ_NO = NO_ACK_NO = None
     START_FLAG = b'\xab'  # 数据帧的起始标志
     ACK_FLAG = b'\xd4'  # 确认帧的起始标志
     SYNC_FLAG = b'\x96'
+    NAK_FLAG = b'\xe2'  # 否认帧的起始标志
+    PROBE_FLAG = b'\xc3'  # 探测帧的起始标志
+    FEC_FLAG = b'\xb7'  # 校验帧的起始标志
+    RESUME_FLAG = b'\xe7'  # 续传查询帧的起始标志
+    # UDP数据报的最大长度
+    MAX_DATAGRAM_SIZE = 65507
+    ARQ_GBN = 0  # 回退N帧
+    ARQ_SR = 1  # 选择重传
+    ARQ_MODE = ARQ_GBN
+    SR_SIZE = None
     TIME_OUT = None
+    MIN_TIME_OUT = 20
+    ADAPTIVE_TIME_OUT = True
+    DUP_ACK_THRESHOLD = 3
+    NAK = True
+    ACK_EVERY = 1
+    ACK_DELAY = 10
+    CONGESTION_CONTROL = True
+    INIT_CWND = 2
+    PACE_RATE = PACE_PACKETS = 0
+    PACE_AUTO = False
+    PACE_BURST = 4
+    SEND_BUFFER = RECEIVE_BUFFER = 0
+    MAX_FRAME_SIZE = None
+    MTU_PROBE = False
+    AGGREGATE = True
+    MMAP_READ = False
+    READ_AHEAD = 0
+    PREALLOCATE = True
+    WRITE_BATCH = 65536
+    WRITE_QUEUE = 0
+    FSYNC = "none"
+    RESUME = False
+    CHECKPOINT_BYTES = 1048576
+    FEC_GROUP = 0
+    CHECKSUM = "crc-ccitt"
+    ENGINE = "thread"
     MAC_ADDRESS: MACAddress = None
     DEST_IP = ""
     DEST_PORT = 0
@@ -74,25 +114,52 @@ class GbnConfig:
 
         # 数据字段的长度
         GbnConfig.DATA_SIZE = _gbn_config.getint("GbnFrame", "DataSize")
-        if GbnConfig.DATA_SIZE not in range(1, 4097):
-            raise ValueError("DataSize must in (1,4097)")
+        if GbnConfig.DATA_SIZE < 2:
+            raise ValueError("DataSize must be greater than 1")
 
         # 发送窗口大小
         GbnConfig.SW_SIZE = _gbn_config.getint("GbnFrame", "SWSize")
         if GbnConfig.SW_SIZE < 1:
             raise ValueError("SWSize must be greater than 0")
 
-        # 帧中序列号的位数
-        GbnConfig.SEQ_BIT_SIZE = math.ceil(math.log(GbnConfig.SW_SIZE + 1, 2) / 8)
+        # 帧中序列号字段的位数，0表示由窗口大小决定，此时序列号空间为SWSize+1
+        # 接收方按同步帧中发送方的窗口接收，两端的SWSize可以不同，但须设置相同的非0 SeqBits
+        seq_bits = _gbn_config.getint("GbnFrame", "SeqBits", fallback=0)
+        if seq_bits == 0:
+            GbnConfig.SEQ_BIT_SIZE = math.ceil(math.log(GbnConfig.SW_SIZE + 1, 2) / 8)
+            GbnConfig.SEQ_SPACE = GbnConfig.SW_SIZE + 1
+        elif seq_bits in (8, 16, 24, 32):
+            GbnConfig.SEQ_BIT_SIZE = seq_bits // 8
+            GbnConfig.SEQ_SPACE = 1 << seq_bits
+        else:
+            raise ValueError("SeqBits must be 0, 8, 16, 24 or 32")
+        if GbnConfig.SW_SIZE >= GbnConfig.SEQ_SPACE:
+            raise ValueError("SWSize must be less than the sequence space of SeqBits")
+
+        # 本端发出的最长帧：起始标志、两个MAC地址、序列号、数据与最长的校验码
+        # 接收不受此限制，两端的DataSize可以不同
+        GbnConfig.MAX_FRAME_SIZE = 13 + GbnConfig.SEQ_BIT_SIZE + GbnConfig.DATA_SIZE + 4
+        if GbnConfig.MAX_FRAME_SIZE > GbnConfig.MAX_DATAGRAM_SIZE:
+            raise ValueError(f"DataSize must not be greater than "
+                             f"{GbnConfig.MAX_DATAGRAM_SIZE - 17 - GbnConfig.SEQ_BIT_SIZE}")
+
+        # 自动重传方式，gbn为回退N帧，sr为选择重传
+        arq_mode = _gbn_config.get("GbnFrame", "ArqMode", fallback="gbn").lower()
+        if arq_mode not in ("gbn", "sr"):
+            raise ValueError("ArqMode must be gbn or sr")
+        GbnConfig.ARQ_MODE = GbnConfig.ARQ_SR if arq_mode == "sr" else GbnConfig.ARQ_GBN
+
+        # 选择重传时在途帧数不超过序列号空间的一半
+        GbnConfig.SR_SIZE = max(1, min(GbnConfig.SW_SIZE, GbnConfig.SEQ_SPACE // 2))
 
         # 起始PDU编号
         GbnConfig.INIT_SEQ_NO = _gbn_config.getint("GbnFrame", "InitSeqNo")
-        if GbnConfig.INIT_SEQ_NO not in range(0, 255):
-            raise ValueError("InitSeqNo must in (1,255)")
+        if GbnConfig.INIT_SEQ_NO not in range(0, GbnConfig.SEQ_SPACE):
+            raise ValueError(f"InitSeqNo must in [0,{GbnConfig.SEQ_SPACE})")
         GbnConfig.print("[INFO] GbnConfig finish config.ini...")
 
         # 不确认帧的ack_num值
-        GbnConfig.NO_ACK_NO = (GbnConfig.INIT_SEQ_NO + GbnConfig.SW_SIZE) % (GbnConfig.SW_SIZE + 1)
+        GbnConfig.NO_ACK_NO = (GbnConfig.INIT_SEQ_NO - 1) % GbnConfig.SEQ_SPACE
 
         # MAC地址
         GbnConfig.MAC_ADDRESS = MACAddress.from_str(_gbn_config.get("Trans", "LocalMac"))
@@ -101,6 +168,112 @@ class GbnConfig:
         # 超时时间
         GbnConfig.TIME_OUT = _gbn_config.getint("Trans", "Timeout")
 
+        # 是否依据测得的RTT调整超时时间，此时Timeout为初始值与上限，MinTimeout为下限
+        GbnConfig.ADAPTIVE_TIME_OUT = _gbn_config.getboolean("Trans", "AdaptiveTimeout", fallback=True)
+        GbnConfig.MIN_TIME_OUT = _gbn_config.getint("Trans", "MinTimeout", fallback=20)
+
+        # 校验算法，可选crc-ccitt、crc32或none(可信回环)
+        GbnConfig.CHECKSUM = _gbn_config.get("Trans", "Checksum", fallback="crc-ccitt").lower()
+        GbnChecksum.init(GbnConfig.CHECKSUM)
+
+        # 传输引擎，thread为收发双线程，asyncio为单事件循环
+        GbnConfig.ENGINE = _gbn_config.get("Trans", "Engine", fallback="thread").lower()
+        if GbnConfig.ENGINE not in ("thread", "asyncio"):
+            raise ValueError("Engine must be thread or asyncio")
+
+        # 收到多少个重复ack后立即重传，0为不启用快速重传
+        GbnConfig.DUP_ACK_THRESHOLD = _gbn_config.getint("Trans", "DupAckThreshold", fallback=3)
+        if GbnConfig.DUP_ACK_THRESHOLD < 0:
+            raise ValueError("DupAckThreshold must not be less than 0")
+
+        # 接收方收到乱序帧时是否发送否认帧
+        GbnConfig.NAK = _gbn_config.getboolean("Trans", "Nak", fallback=True)
+
+        # 接收方每收到多少个按序帧发送一次累积确认，1为逐帧确认，AckDelay(毫秒)后未凑满也会确认
+        # 这是上限，拥塞窗口较小时及出现丢帧后接收方按在途帧数逐帧或少量合并确认
+        GbnConfig.ACK_EVERY = _gbn_config.getint("Trans", "AckEvery", fallback=1)
+        if GbnConfig.ACK_EVERY < 1:
+            raise ValueError("AckEvery must not be less than 1")
+        GbnConfig.ACK_DELAY = _gbn_config.getint("Trans", "AckDelay", fallback=10)
+        if GbnConfig.ACK_DELAY < 0:
+            raise ValueError("AckDelay must not be less than 0")
+
+        # 是否启用拥塞控制，在途帧数不超过拥塞窗口与SWSize中较小者
+        GbnConfig.CONGESTION_CONTROL = _gbn_config.getboolean("Trans", "CongestionControl", fallback=True)
+        GbnConfig.INIT_CWND = _gbn_config.getint("Trans", "InitCwnd", fallback=2)
+        if GbnConfig.INIT_CWND < 1:
+            raise ValueError("InitCwnd must not be less than 1")
+
+        # 数据帧的发送速率，PaceRate为字节每秒，PacePackets为帧每秒，0为不限制
+        # PaceAuto依据拥塞窗口与RTT计算速率，PaceBurst为可连续发出的帧数
+        GbnConfig.PACE_RATE = _gbn_config.getint("Trans", "PaceRate", fallback=0)
+        GbnConfig.PACE_PACKETS = _gbn_config.getint("Trans", "PacePackets", fallback=0)
+        if GbnConfig.PACE_RATE < 0 or GbnConfig.PACE_PACKETS < 0:
+            raise ValueError("PaceRate and PacePackets must not be less than 0")
+        GbnConfig.PACE_AUTO = _gbn_config.getboolean("Trans", "PaceAuto", fallback=False)
+        GbnConfig.PACE_BURST = _gbn_config.getint("Trans", "PaceBurst", fallback=4)
+        if GbnConfig.PACE_BURST < 1:
+            raise ValueError("PaceBurst must not be less than 1")
+
+        # 套接字的内核发送与接收缓冲区大小(字节)，0为使用系统默认值
+        GbnConfig.SEND_BUFFER = _gbn_config.getint("Trans", "SendBuffer", fallback=0)
+        GbnConfig.RECEIVE_BUFFER = _gbn_config.getint("Trans", "ReceiveBuffer", fallback=0)
+        if GbnConfig.SEND_BUFFER < 0 or GbnConfig.RECEIVE_BUFFER < 0:
+            raise ValueError("SendBuffer and ReceiveBuffer must not be less than 0")
+
+        # 是否在传输开始前探测端到端可通过的最长帧，数据字段长度不超过DataSize
+        GbnConfig.MTU_PROBE = _gbn_config.getboolean("Trans", "MtuProbe", fallback=False)
+
+        # 是否将较短的记录(文件名、结束标志、文件末尾的数据)打包进同一帧
+        GbnConfig.AGGREGATE = _gbn_config.getboolean("Trans", "Aggregate", fallback=True)
+
+        # 是否以内存映射读取发送的文件，数据从映射中直接复制进帧，不再每帧调用一次read
+        GbnConfig.MMAP_READ = _gbn_config.getboolean("Trans", "MmapRead", fallback=False)
+
+        # 后台线程预先读取并编码的帧数，滑动窗口时直接取用，0为在处理ack时读取
+        GbnConfig.READ_AHEAD = _gbn_config.getint("Trans", "ReadAhead", fallback=0)
+        if GbnConfig.READ_AHEAD < 0:
+            raise ValueError("ReadAhead must not be less than 0")
+
+        # 接收方是否按发送方告知的文件大小预先分配磁盘空间
+        GbnConfig.PREALLOCATE = _gbn_config.getboolean("Trans", "Preallocate", fallback=True)
+
+        # 接收方攒够多少字节的数据再按偏移写入一次，0为每个记录写入一次
+        GbnConfig.WRITE_BATCH = _gbn_config.getint("Trans", "WriteBatch", fallback=65536)
+        if GbnConfig.WRITE_BATCH < 0:
+            raise ValueError("WriteBatch must not be less than 0")
+
+        # 接收方交给写入线程的帧最多排队的个数，0为在接收线程中直接写入
+        GbnConfig.WRITE_QUEUE = _gbn_config.getint("Trans", "WriteQueue", fallback=0)
+        if GbnConfig.WRITE_QUEUE < 0:
+            raise ValueError("WriteQueue must not be less than 0")
+
+        # 文件接收完毕时的落盘方式：none不同步，data只同步数据，full同步数据与元数据
+        GbnConfig.FSYNC = _gbn_config.get("Trans", "Fsync", fallback="none").lower()
+        if GbnConfig.FSYNC not in ("none", "data", "full"):
+            raise ValueError("Fsync must be none, data or full")
+
+        # 接收方每写入多少字节记录一次续传检查点，0为不记录，此时总是从头接收
+        GbnConfig.CHECKPOINT_BYTES = _gbn_config.getint("Trans", "CheckpointBytes", fallback=1048576)
+        if GbnConfig.CHECKPOINT_BYTES < 0:
+            raise ValueError("CheckpointBytes must not be less than 0")
+
+        # 前向纠错：每FecGroup个数据帧后发送一个异或校验帧，接收方可恢复组内的一个缺失帧，0为关闭
+        # 校验帧比数据帧多出3字节，数据字段相应缩短；接收方缓存乱序帧，序列号空间需能区分新旧帧
+        GbnConfig.FEC_GROUP = _gbn_config.getint("Trans", "FecGroup", fallback=0)
+        if GbnConfig.FEC_GROUP:
+            if not 1 <= GbnConfig.FEC_GROUP <= min(GbnConfig.SW_SIZE, 255):
+                raise ValueError("FecGroup must be 0, or between 1 and min(SWSize, 255)")
+            if GbnConfig.SEQ_SPACE < 2 * GbnConfig.SW_SIZE:
+                raise ValueError("FecGroup needs SeqBits with a sequence space of at least 2 * SWSize")
+            if GbnConfig.DATA_SIZE < 5:
+                raise ValueError("DataSize must be greater than 4 with FecGroup")
+
+        # 发送方是否在同步后询问接收方各文件已接收的字节数，从该处继续发送
+        GbnConfig.RESUME = _gbn_config.getboolean("Trans", "Resume", fallback=False)
+        if GbnConfig.RESUME and GbnConfig.DATA_SIZE - (3 if GbnConfig.FEC_GROUP else 0) < 9:
+            raise ValueError("Resume needs a data field of at least 9 bytes")
+
         # 模拟时本地的端口
         GbnConfig.UDP_PORT = _gbn_config.getint("Trans", "UDPPort")
 
@@ -116,8 +289,14 @@ class GbnConfig:
                         _gbn_config.get("Log", "ReceiveLogName"),
                         _gbn_config.getboolean("Log", "Show"))
 
+        # 每n帧随机产生一次位错误或丢失，0为不产生
         GbnConfig.ERROR_RATE = _gbn_config.getint("Random", "ErrorRate")
         GbnConfig.LOST_RATE = _gbn_config.getint("Random", "LostRate")
+        if GbnConfig.ERROR_RATE < 0 or GbnConfig.LOST_RATE < 0:
+            raise ValueError("ErrorRate and LostRate must not be less than 0")
+        # 不计算校验和时位错误无法被发现，会直接写入文件
+        if GbnConfig.CHECKSUM == "none" and GbnConfig.ERROR_RATE:
+            raise ValueError("Checksum none can not detect the errors of ErrorRate, set ErrorRate = 0")
 
         GbnRandom.init(GbnConfig.ERROR_RATE, GbnConfig.LOST_RATE)
 
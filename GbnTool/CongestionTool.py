@@ -0,0 +1,75 @@
+#   Copyright 2023 Gaozih/Gzh0821 https://github.com/Gzh0821
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from GbnTool.ConfigTool import GbnConfig
+
+
+# 拥塞控制工具，限制发送方在途帧数
+
+class CongestionWindow:
+    """
+    An AIMD congestion window: slow start, additive increase, multiplicative decrease on loss.
+    """
+
+    def __init__(self, max_window: int):
+        """
+        Initialize the congestion window.
+        :param max_window: the window never grows beyond it
+        """
+        self.max_window = max_window
+        self.cwnd = float(min(GbnConfig.INIT_CWND, max_window)) if GbnConfig.CONGESTION_CONTROL else float(max_window)
+        self.ssthresh = float(max_window)
+        # 已确认的帧数，窗口降低后直到在途帧都被确认前不再降低
+        self.acked_count = 0
+        self.recover_count = 0
+
+    @property
+    def window(self) -> int:
+        """
+        Get the count of frames allowed in flight.
+        :return:
+        """
+        return int(self.cwnd)
+
+    def on_ack(self, count: int = 1):
+        """
+        Grow the window with newly acknowledged frames.
+        :param count: count of frames acknowledged
+        :return:
+        """
+        self.acked_count += count
+        if not GbnConfig.CONGESTION_CONTROL:
+            return
+        if self.cwnd < self.ssthresh:
+            # 慢启动，每确认一帧窗口加一
+            self.cwnd += count
+        else:
+            # 拥塞避免，每确认一个窗口的帧窗口加一
+            self.cwnd += count / self.cwnd
+        self.cwnd = min(self.cwnd, float(self.max_window))
+
+    def on_loss(self, in_flight: int, timeout: bool):
+        """
+        Shrink the window once per loss event.
+        :param in_flight: count of frames in flight when the loss is found
+        :param timeout: restart from slow start, otherwise halve the window
+        :return:
+        """
+        if not GbnConfig.CONGESTION_CONTROL:
+            return
+        if not timeout and self.acked_count < self.recover_count:
+            return
+        self.recover_count = self.acked_count + in_flight
+        self.ssthresh = max(in_flight / 2, 2.0)
+        self.cwnd = 1.0 if timeout else min(self.ssthresh, self.cwnd)
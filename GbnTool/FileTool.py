@@ -12,98 +12,486 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
-from GbnTool import os, math
+from GbnTool import configparser, ctypes, os, math, mmap, sys
 from GbnTool.ConfigTool import GbnConfig
 
 
+def _load_fallocate():
+    """
+    Get fallocate of the C library, os.posix_fallocate always extends the file to the reserved length.
+    :return: None if it is not available
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        func = getattr(libc, "fallocate64", None) or libc.fallocate
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    func.restype = ctypes.c_int
+    return func
+
+
+# 只分配磁盘空间而不改变文件长度
+FALLOC_FL_KEEP_SIZE = 1
+_fallocate = _load_fallocate()
+
+
 # 文件读写工具
 
 class FileReader:
     BUF_SIZE = GbnConfig.DATA_SIZE - 1
+    # 每个文件依次产生文件名、续传偏移、文件大小、数据与结束标志记录，续传偏移只在续传时产生
+    NAME, OFFSET, SIZE, DATA, END = range(5)
+    # 续传偏移与文件大小记录：标志与8字节的整数
+    SIZE_RECORD = 9
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, *more_path: str):
         """
-        An Iterator to read file.
+        An Iterator to read files, several files are sent one after another.
         :param file_path: file path in system.
+        :param more_path: more files to send after it.
         """
+        self.path_list = [file_path, *more_path]
+        self.file_path = ';'.join(self.path_list)
+        # 先取得所有文件的大小，文件不存在时立即报错，文件在读到时才打开
+        self.size_list = [os.path.getsize(path) for path in self.path_list]
+        self.name_list = [os.path.basename(path).encode() for path in self.path_list]
+        self.mtime_list = [os.stat(path).st_mtime_ns for path in self.path_list]
+        # 各文件开始发送数据的偏移，续传时由接收方告知
+        self.offset_list = [0] * len(self.path_list)
+        self.file_size = sum(self.size_list)
+        self.total_size = self.file_size + sum(len(name) for name in self.name_list)
         self.end_flag = False
-        self.name_point = 0
-        self.file_path = file_path
-        self.file = open(file_path, 'rb')
-        self.file_size = os.path.getsize(file_path)
-        binary_data = os.path.basename(file_path).encode()
-        self.file_path_list = [(GbnConfig.FILE_NAME_FLAG + binary_data[i:i + self.BUF_SIZE]) for i in
-                               range(0, len(binary_data), self.BUF_SIZE)]
+        self.file = None
+        # 内存映射模式下当前文件的映射及其memoryview
+        self.map = None
+        self.view = None
+        self.index = -1
+        self.state = self.END
+        self.name_offset = 0
         self.read_size = 0
+        # 已读出的文件名与数据的总字节数
+        self.progress = 0
+        # 是否发送文件大小记录，不回复同步帧的旧接收方会把该记录当作数据写入文件
+        self.announce_size = True
+        self._next_file()
+
+    def _next_file(self):
+        """
+        Move to the next file.
+        :return:
+        """
+        self._close_file()
+        self.index += 1
+        if self.index == len(self.path_list):
+            self.end_flag = True
+            return
+        self.state = self.NAME
+        self.name_offset = 0
+        self.read_size = self.offset_list[self.index]
+        self.progress += self.read_size
+
+    def identity_list(self) -> list:
+        """
+        Get what identifies each file for a resumed transfer.
+        :return: list of (name, size, modification time in nanoseconds)
+        """
+        return list(zip(self.name_list, self.size_list, self.mtime_list))
+
+    def resume(self, offset_list: list):
+        """
+        Continue each file from an offset, only before anything is read.
+        :param offset_list: offsets in the order of the files, files not listed start from 0
+        :return:
+        """
+        for index, offset in enumerate(offset_list[:len(self.path_list)]):
+            # 超出文件大小的偏移说明接收方的记录有误，从头发送
+            self.offset_list[index] = offset if offset <= self.size_list[index] else 0
+        self.progress -= self.read_size
+        self.read_size = self.offset_list[self.index]
+        self.progress += self.read_size
+
+    def _open_file(self):
+        """
+        Open the current file, and map it in the mmap mode.
+        :return:
+        """
+        self.file = open(self.path_list[self.index], 'rb')
+        self.file.seek(self.read_size)
+        if GbnConfig.MMAP_READ and self.size_list[self.index]:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+
+    def _close_file(self):
+        """
+        Close the current file and its map.
+        :return:
+        """
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _size_state(self) -> int:
+        """
+        Get the state after the name and the resume offset of the current file.
+        :return:
+        """
+        if self.announce_size:
+            return self.SIZE
+        return self.DATA if self.read_size < self.size_list[self.index] else self.END
+
+    def _record_size(self, space: int) -> int:
+        """
+        Get the size of the next record if it is written into space bytes.
+        :param space:
+        :return: 0 if the iteration is over
+        """
+        if self.end_flag:
+            return 0
+        if self.state == self.NAME:
+            return 1 + min(len(self.name_list[self.index]) - self.name_offset, space - 1)
+        if self.state == self.OFFSET or self.state == self.SIZE:
+            return self.SIZE_RECORD
+        if self.state == self.DATA:
+            return 1 + min(self.size_list[self.index] - self.read_size, space - 1)
+        return 1
+
+    def _read_record(self, buffer: memoryview) -> int:
+        """
+        Write the next record into a buffer.
+        :param buffer: writable buffer, names and data are split to fit it
+        :return: length of the record, 0 if the iteration is over
+        """
+        if self.end_flag:
+            return 0
+        if self.state == self.NAME:
+            # 写入文件名，较长的文件名分多帧写入
+            name = self.name_list[self.index]
+            chunk = name[self.name_offset:self.name_offset + len(buffer) - 1]
+            self.name_offset += len(chunk)
+            self.progress += len(chunk)
+            buffer[0] = GbnConfig.FILE_NAME_FLAG[0]
+            buffer[1:1 + len(chunk)] = chunk
+            if self.name_offset == len(name):
+                if self.read_size:
+                    self.state = self.OFFSET
+                else:
+                    self.state = self._size_state() if self.size_list[self.index] else self.END
+            return len(chunk) + 1
+        if self.state == self.OFFSET:
+            # 续传要求数据字段放得下该记录
+            self.state = self._size_state()
+            buffer[0] = GbnConfig.FILE_OFFSET_FLAG[0]
+            buffer[1:self.SIZE_RECORD] = self.read_size.to_bytes(8, byteorder='big')
+            return self.SIZE_RECORD
+        if self.state == self.SIZE:
+            # 已全部接收的文件只需再发送一次结束标志
+            self.state = self.DATA if self.read_size < self.size_list[self.index] else self.END
+            # 数据字段放不下文件大小时不发送，接收方不预分配空间
+            if len(buffer) < self.SIZE_RECORD:
+                return self._read_record(buffer)
+            buffer[0] = GbnConfig.FILE_SIZE_FLAG[0]
+            buffer[1:self.SIZE_RECORD] = self.size_list[self.index].to_bytes(8, byteorder='big')
+            return self.SIZE_RECORD
+        if self.state == self.DATA:
+            if self.file is None:
+                self._open_file()
+            buffer[0] = GbnConfig.FILE_DATA_FLAG[0]
+            if self.view is not None:
+                # 从映射中直接复制，读取期间文件变短时以映射的长度为准
+                # 帧的数据字段还包含标志、文件名等记录，与文件内容不按固定块对齐，因此按偏移复制而不按块号取切片
+                end = self.read_size + min(len(buffer) - 1, self.size_list[self.index] - self.read_size)
+                chunk = self.view[self.read_size:end]
+                size = len(chunk)
+                buffer[1:1 + size] = chunk
+                chunk.release()
+            else:
+                size = self.file.readinto(buffer[1:1 + self.size_list[self.index] - self.read_size])
+            self.read_size += size
+            self.progress += size
+            if size == 0 or self.read_size >= self.size_list[self.index]:
+                self.state = self.END
+            return size + 1
+        # 写入结束标志
+        buffer[0] = GbnConfig.FILE_END_FLAG[0]
+        self._next_file()
+        return 1
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.name_point < len(self.file_path_list):
-            # 返回文件名
-            self.name_point += 1
-            return self.file_path_list[self.name_point - 1]
-        elif self.end_flag:
+        buffer = bytearray(GbnConfig.DATA_SIZE)
+        size = self.read_into(memoryview(buffer))
+        if size == 0:
             # 终止迭代
             return None
-        elif self.read_size >= self.file_size:
-            # 返回结束标志
-            self.file.close()
-            self.end_flag = True
-            return GbnConfig.FILE_END_FLAG
-        else:
-            data = self.file.read(GbnConfig.DATA_SIZE - 1)
-            self.read_size += len(data)
-            return GbnConfig.FILE_DATA_FLAG + data
+        return bytes(buffer[:size])
+
+    def read_into(self, buffer: memoryview) -> int:
+        """
+        Read the next payload directly into a buffer.
+        Records shorter than the buffer are packed with the following ones into a container.
+        :param buffer: writable buffer, its length is the length of the data field
+        :return: length of the payload, 0 if the iteration is over
+        """
+        first_size = self._record_size(len(buffer))
+        # 最后一个文件的结束标志之后没有记录，单个记录或填满缓冲区的记录不打包
+        last = self.state == self.END and self.index == len(self.path_list) - 1
+        if first_size == 0 or last or not GbnConfig.AGGREGATE or first_size + 6 > len(buffer):
+            return self._read_record(buffer)
+        # 容器依次为：打包标志，若干个(2字节长度，记录)
+        buffer[0] = GbnConfig.FILE_PACK_FLAG[0]
+        offset = 1
+        while True:
+            space = len(buffer) - offset - 2
+            # 文件名与数据记录至少带一个字节，放不下时与文件大小记录一样留给下一帧
+            if space < 1 or (space < 2 and self.state != self.END) or not 0 < self._record_size(space) <= space:
+                break
+            size = self._read_record(buffer[offset + 2:])
+            buffer[offset:offset + 2] = size.to_bytes(2, byteorder='big')
+            offset += 2 + size
+        return offset
 
     def __del__(self):
-        if hasattr(self, "file"):
-            self.file.close()
+        if getattr(self, "file", None) is not None:
+            self._close_file()
 
     def __len__(self):
-        return len(self.file_path_list) + math.ceil(self.file_size / (GbnConfig.DATA_SIZE - 1)) + 1
+        return sum(math.ceil(len(name) / self.BUF_SIZE) + math.ceil(size / self.BUF_SIZE) + 1
+                   for name, size in zip(self.name_list, self.size_list))
 
 
 class FileWriter:
+    # 续传检查点文件的后缀，位于接收的文件旁
+    CHECKPOINT_SUFFIX = ".gbnck"
+
     def __init__(self):
         """
         A tool to write file
         """
         self.file_path = None
         self.file_path_list = []
-        self.file = None
+        self.fd = None
         self.if_open = False
         self.count = 0
+        # 发送方告知的文件大小，已接收的数据字节数与尚未写入的数据
+        self.file_size = None
+        self.offset = 0
+        self.batch = bytearray()
+        # 续传查询中各文件名对应的文件标识，只有带标识的文件才记录检查点
+        self.identity_dict = {}
+        self.identity = None
+        self.checkpoint_offset = 0
+
+    @staticmethod
+    def load_checkpoint(file_path: str, identity: str) -> int:
+        """
+        Get the bytes of a file committed in an earlier transfer.
+        :param file_path:
+        :param identity: identity of the file from the sender, the checkpoint of another file is ignored
+        :return: offset to resume from, 0 if there is no usable checkpoint
+        """
+        checkpoint = configparser.ConfigParser()
+        if not GbnConfig.CHECKPOINT_BYTES or not checkpoint.read(file_path + FileWriter.CHECKPOINT_SUFFIX):
+            return 0
+        try:
+            if checkpoint.get("Checkpoint", "Identity") != identity:
+                return 0
+            committed = checkpoint.getint("Checkpoint", "Committed")
+        except (configparser.Error, ValueError):
+            return 0
+        # 文件在检查点之后被改动过时从头接收
+        if not os.path.isfile(file_path) or os.path.getsize(file_path) < committed:
+            return 0
+        return committed
+
+    def _save_checkpoint(self, force: bool = False):
+        """
+        Record the bytes committed to the file, every CheckpointBytes bytes.
+        :param force: record even if fewer bytes are committed since the last record
+        :return:
+        """
+        committed = self.offset - len(self.batch)
+        if self.identity is None or (not force and committed - self.checkpoint_offset < GbnConfig.CHECKPOINT_BYTES):
+            return
+        # 检查点只记录已按Fsync方式落盘的数据
+        self._sync()
+        checkpoint = configparser.ConfigParser()
+        checkpoint["Checkpoint"] = {"Identity": self.identity, "Size": str(self.file_size),
+                                    "Committed": str(committed)}
+        checkpoint_path = self.file_path + self.CHECKPOINT_SUFFIX
+        # 先写入临时文件再替换，中途退出不会留下不完整的检查点
+        with open(checkpoint_path + ".tmp", "w") as checkpoint_file:
+            checkpoint.write(checkpoint_file)
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        self.checkpoint_offset = committed
+
+    def _remove_checkpoint(self):
+        if self.identity is None:
+            return
+        try:
+            os.remove(self.file_path + self.CHECKPOINT_SUFFIX)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def unpack(data):
+        """
+        Split a payload into records, a payload not packed is a record itself.
+        :param data: bytes-like object
+        :return: generator of records, slices of data
+        """
+        if not data or data[0] != GbnConfig.FILE_PACK_FLAG[0]:
+            yield data
+            return
+        offset = 1
+        while offset + 2 <= len(data):
+            size = int.from_bytes(data[offset:offset + 2], byteorder='big')
+            offset += 2
+            yield data[offset:offset + size]
+            offset += size
+
+    @staticmethod
+    def _pwrite(fd: int, data, offset: int) -> int:
+        """
+        Write data at the offset of the file without moving the file position.
+        :param fd:
+        :param data: bytes-like object
+        :param offset:
+        :return: count of the bytes written
+        """
+        if hasattr(os, "pwrite"):
+            return os.pwrite(fd, data, offset)
+        # 不支持pwrite的平台上先定位再写入
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, data)
+
+    def _write_at(self, data, offset: int):
+        """
+        Write all the data at the offset.
+        :param data: bytes-like object
+        :param offset:
+        :return:
+        """
+        with memoryview(data) as view:
+            written = 0
+            while written < len(view):
+                written += self._pwrite(self.fd, view[written:], offset + written)
 
-    def write(self, data: bytes):
+    def _flush(self):
+        """
+        Write the batched data to the file.
+        :return:
+        """
+        if self.batch:
+            self._write_at(self.batch, self.offset - len(self.batch))
+            self.batch.clear()
+
+    def _preallocate(self, size: int):
+        """
+        Reserve the disk space of the file, the length of the file still grows with the data written.
+        :param size:
+        :return:
+        """
+        self.file_size = size
+        if not GbnConfig.PREALLOCATE or not size or _fallocate is None:
+            return
+        # 文件长度保持为已写入的数据，中断的文件不会显得已接收完整，续传时也能按长度检查数据是否还在
+        # 文件系统不支持预分配时返回错误，按普通方式写入
+        _fallocate(self.fd, FALLOC_FL_KEEP_SIZE, 0, size)
+
+    def _sync(self):
+        """
+        Sync the file to the disk by the Fsync policy.
+        :return:
+        """
+        if GbnConfig.FSYNC == "full" or (GbnConfig.FSYNC == "data" and not hasattr(os, "fdatasync")):
+            os.fsync(self.fd)
+        elif GbnConfig.FSYNC == "data":
+            os.fdatasync(self.fd)
+
+    def _close(self):
+        """
+        Write the rest of the data, cut the file to the data received and sync it by the Fsync policy.
+        :return:
+        """
+        self._flush()
+        # 续传前的文件可能比实际接收的数据长，以实际数据为准
+        if os.fstat(self.fd).st_size != self.offset:
+            os.ftruncate(self.fd, self.offset)
+        self._sync()
+        os.close(self.fd)
+        self.fd = None
+        self._remove_checkpoint()
+
+    def write(self, data):
+        """
+        Write a record to the file.
+        :param data: bytes-like object, a memoryview is only used until this call returns
+        :return:
+        """
         self.count += 1
-        if data[0] == int.from_bytes(GbnConfig.FILE_NAME_FLAG, "big"):
-            self.file_path_list.append(data[1:].decode())
-        if (not self.if_open) and data[0] != int.from_bytes(GbnConfig.FILE_NAME_FLAG, "big"):
+        flag = data[0]
+        if flag == GbnConfig.FILE_NAME_FLAG[0]:
+            self.file_path_list.append(bytes(data[1:]))
+            return self.count, None
+        if not self.if_open:
             self.if_open = True
-            self.file_path = ''.join(self.file_path_list)
-            self.file = open(self.file_path, "wb")
-            self.file.write(data[1:])
-        elif data[0] == int.from_bytes(GbnConfig.FILE_DATA_FLAG, "big"):
-            self.file.write(data[1:])
-        elif data[0] == int.from_bytes(GbnConfig.FILE_END_FLAG, "big"):
-            self.file.close()
+            # 文件名可能在多字节字符中间分段，拼接后再解码
+            self.file_path = b''.join(self.file_path_list).decode()
+            self.identity = self.identity_dict.get(self.file_path) if GbnConfig.CHECKPOINT_BYTES else None
+            # 续传的文件保留已接收的数据
+            mode = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+            if flag != GbnConfig.FILE_OFFSET_FLAG[0]:
+                mode |= os.O_TRUNC
+            self.fd = os.open(self.file_path, mode, 0o666)
+        if flag == GbnConfig.FILE_DATA_FLAG[0]:
+            chunk = data[1:]
+            self.offset += len(chunk)
+            if not self.batch and len(chunk) >= GbnConfig.WRITE_BATCH:
+                # 足够长的数据直接按偏移写入，不经过批量缓冲
+                self._write_at(chunk, self.offset - len(chunk))
+            else:
+                self.batch += chunk
+                if len(self.batch) >= GbnConfig.WRITE_BATCH:
+                    self._flush()
+            self._save_checkpoint()
+        elif flag == GbnConfig.FILE_OFFSET_FLAG[0]:
+            self.offset = self.checkpoint_offset = int.from_bytes(data[1:], byteorder='big')
+        elif flag == GbnConfig.FILE_SIZE_FLAG[0]:
+            self._preallocate(int.from_bytes(data[1:], byteorder='big'))
+            self._save_checkpoint(force=True)
+        elif flag == GbnConfig.FILE_END_FLAG[0]:
+            self._close()
             tmp_count = self.count
             tmp_path = self.file_path
             self.reset()
             return tmp_count, tmp_path
-        elif data[0] == int.from_bytes(GbnConfig.FILE_NONE_FLAG, "big"):
+        elif flag == GbnConfig.FILE_NONE_FLAG[0]:
             return -1, None
         return self.count, None
 
     def reset(self):
         self.file_path = None
         self.file_path_list = []
-        self.file = None
+        self.fd = None
         self.if_open = False
         self.count = 0
+        self.file_size = None
+        self.offset = 0
+        self.batch.clear()
+        self.identity = None
+        self.checkpoint_offset = 0
 
     def __del__(self):
-        if self.file is not None:
-            self.file.close()
+        if self.fd is not None:
+            os.close(self.fd)
@@ -12,11 +12,13 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
-from GbnTool import crcmod, time, tqdm
+from GbnTool import array, queue, threading, time, tqdm
 from GbnTool.AddrTool import MACAddress
+from GbnTool.CheckTool import GbnChecksum
 from GbnTool.ConfigTool import GbnConfig
 from GbnTool.ErrorTool import CRCError
 from GbnTool.FileTool import FileReader
+from GbnTool.TimerTool import RttEstimator, TimerHeap
 
 
 class GbnFrame:
@@ -25,6 +27,8 @@ class GbnFrame:
     """
     START_FLAG = GbnConfig.START_FLAG
     DATA_FRAME = True
+    # 数据帧与校验帧由发送方发出，属于本端发送数据的会话
+    DIRECTION = GbnChecksum.SEND
 
     def __init__(self, src_mac: MACAddress, dst_mac: MACAddress, seq_num: int, payload: bytes):
         if src_mac == dst_mac:
@@ -38,25 +42,24 @@ class GbnFrame:
         if len(payload) > GbnConfig.DATA_SIZE:
             raise ValueError('Payload is too long')
         self.payload = payload  # 帧的数据
+        self._frame_bytes = None
 
     @property
     def frame_bytes(self):
         """
-        Encapsulates the frame into a byte string in binary format.
+        Encapsulates the frame into a byte string in binary format, only encoded at the first time.
         :return:
         """
-        # 将帧的序列号、确认号、数据封装成二进制格式的字节串
-        src_mac = bytes(self.src_mac_addr)
-        dst_mac = bytes(self.dst_mac_addr)
-        seq_bytes = self.seq_num.to_bytes(GbnConfig.SEQ_BIT_SIZE, byteorder='big')
-        payload_bytes = self.payload
+        if self._frame_bytes is None:
+            # 将帧的序列号、确认号、数据封装成二进制格式的字节串
+            header = self.START_FLAG + bytes(self.src_mac_addr) + bytes(self.dst_mac_addr)
+            body = self.seq_num.to_bytes(GbnConfig.SEQ_BIT_SIZE, byteorder='big') + self.payload
 
-        # 计算CRC校验码
-        crc_func = crcmod.predefined.mkCrcFun('crc-ccitt-false')
-        crc = crc_func(self.START_FLAG + src_mac + dst_mac + seq_bytes + payload_bytes)
-        checksum = crc.to_bytes(2, byteorder='big')
-        # 将源MAC地址、目的MAC地址、序列号、确认号、数据、校验和合并成一个字节串，并在开头加上起始标志
-        return self.START_FLAG + src_mac + dst_mac + seq_bytes + payload_bytes + checksum
+            # 计算校验码，校验算法由与目的地址协商的结果决定，帧头前缀的中间值已缓存
+            checksum = GbnChecksum.of(self.dst_mac_addr.mac_bytes, self.DIRECTION).checksum(body, header)
+            # 将起始标志、源MAC地址、目的MAC地址、序列号、数据、校验和合并成一个字节串
+            self._frame_bytes = header + body + checksum
+        return self._frame_bytes
 
     def __bytes__(self):
         return self.frame_bytes
@@ -76,37 +79,357 @@ class AckFrame(GbnFrame):
     """
     START_FLAG = GbnConfig.ACK_FLAG
     DATA_FRAME = False
+    # 确认帧由接收方发出，属于对端发送数据的会话
+    DIRECTION = GbnChecksum.RECEIVE
 
     def __init__(self, src_mac: MACAddress, dst_mac: MACAddress, ack_num: int):
         super().__init__(src_mac, dst_mac, ack_num, b"")
 
 
+class NakFrame(AckFrame):
+    """
+    A class to encapsulate a NAK frame, carrying the sequence number the receiver is waiting for.
+    """
+    START_FLAG = GbnConfig.NAK_FLAG
+
+
+class FecFrame(GbnFrame):
+    """
+    A parity frame of a group of data frames, the XOR of their data fields rebuilds one missing frame.
+    """
+    START_FLAG = GbnConfig.FEC_FLAG
+    DATA_FRAME = False
+    HEADER_SIZE = 3
+
+    def __init__(self, src_mac: MACAddress, dst_mac: MACAddress, seq_num: int, count: int, length: int,
+                 parity: bytes):
+        """
+        Initialize the parity frame.
+        :param src_mac:
+        :param dst_mac:
+        :param seq_num: sequence number of the first frame in the group
+        :param count: count of the frames in the group
+        :param length: XOR of the lengths of the data fields
+        :param parity: XOR of the data fields, the shorter ones padded with zeros
+        """
+        # 数据字段依次为：组内帧数、各帧长度的异或、各帧数据的异或
+        super().__init__(src_mac, dst_mac, seq_num, b"")
+        self.payload = bytes([count]) + length.to_bytes(2, byteorder='big') + parity
+
+
+class SyncFrame:
+    """
+    A frame to reset the receiver, carrying the options chosen by the sender for the session.
+    The receiver sends the same options back as the reply.
+    """
+
+    def __init__(self, src_mac: MACAddress, dst_mac: MACAddress, checksum: int = GbnChecksum.CRC_CCITT,
+                 arq_mode: int = GbnConfig.ARQ_GBN, window_size: int = 0, reply: bool = False):
+        """
+        Initialize the SYNC frame.
+        :param src_mac:
+        :param dst_mac:
+        :param checksum: checksum algorithm of the session
+        :param arq_mode: ARQ_GBN or ARQ_SR
+        :param window_size: most frames the sender has in flight, 0 if not told
+        :param reply:
+        """
+        self.src_mac_addr = src_mac
+        self.dst_mac_addr = dst_mac
+        self.checksum = checksum
+        self.arq_mode = arq_mode
+        self.window_size = window_size
+        self.reply = reply
+
+    @property
+    def frame_bytes(self) -> bytes:
+        # 同步帧依次为：起始标志、源MAC地址、目的MAC地址、校验算法、重传方式、2字节发送窗口大小、是否为回复
+        return (GbnConfig.SYNC_FLAG + self.src_mac_addr.to_bytes() + self.dst_mac_addr.to_bytes() +
+                bytes([self.checksum, self.arq_mode]) + self.window_size.to_bytes(2, byteorder='big') +
+                bytes([self.reply]))
+
+    @classmethod
+    def from_bytes(cls, frame_bytes):
+        """
+        Parse a SYNC frame, options missing from older senders take their default values.
+        :param frame_bytes: bytes-like object
+        :return:
+        """
+        sync_frame = cls(MACAddress.from_bytes(frame_bytes[1:7]), MACAddress.from_bytes(frame_bytes[7:13]))
+        if len(frame_bytes) > 13:
+            sync_frame.checksum = frame_bytes[13]
+        if len(frame_bytes) > 14:
+            sync_frame.arq_mode = frame_bytes[14]
+        if len(frame_bytes) > 16:
+            sync_frame.window_size = int.from_bytes(frame_bytes[15:17], byteorder='big')
+        if len(frame_bytes) > 17:
+            sync_frame.reply = bool(frame_bytes[17])
+        return sync_frame
+
+
+class ProbeFrame:
+    """
+    A frame to find if a datagram of the size passes end to end, the reply carries the size received.
+    """
+    HEADER_SIZE = 18
+
+    def __init__(self, src_mac: MACAddress, dst_mac: MACAddress, size: int, reply: bool = False):
+        self.src_mac_addr = src_mac
+        self.dst_mac_addr = dst_mac
+        self.size = size
+        self.reply = reply
+
+    @property
+    def frame_bytes(self) -> bytes:
+        # 探测帧依次为：起始标志、源MAC地址、目的MAC地址、帧长、是否为回复，请求帧以0填充至帧长
+        header = (GbnConfig.PROBE_FLAG + self.src_mac_addr.to_bytes() + self.dst_mac_addr.to_bytes() +
+                  self.size.to_bytes(4, byteorder='big') + bytes([self.reply]))
+        if self.reply:
+            return header
+        return header + bytes(self.size - self.HEADER_SIZE)
+
+    @classmethod
+    def from_bytes(cls, frame_bytes):
+        """
+        Parse a probe frame.
+        :param frame_bytes: bytes-like object
+        :return:
+        """
+        if len(frame_bytes) < cls.HEADER_SIZE:
+            raise ValueError('Invalid frame format')
+        return cls(MACAddress.from_bytes(frame_bytes[1:7]), MACAddress.from_bytes(frame_bytes[7:13]),
+                   int.from_bytes(frame_bytes[13:17], byteorder='big'), bool(frame_bytes[17]))
+
+
+class ResumeFrame:
+    """
+    A frame asking the receiver where to resume each file, the reply carries the offsets in the same order.
+    """
+    HEADER_SIZE = 16
+
+    def __init__(self, src_mac: MACAddress, dst_mac: MACAddress, entry_list: list, reply: bool = False):
+        """
+        Initialize the resume frame.
+        :param src_mac:
+        :param dst_mac:
+        :param entry_list: list of (name, size, modification time) in a query, list of offsets in a reply
+        :param reply:
+        """
+        self.src_mac_addr = src_mac
+        self.dst_mac_addr = dst_mac
+        self.entry_list = entry_list
+        self.reply = reply
+
+    @staticmethod
+    def entry_size(name: bytes) -> int:
+        """
+        Get the length of a file in a query.
+        :param name:
+        :return:
+        """
+        return 18 + len(name)
+
+    @property
+    def frame_bytes(self) -> bytes:
+        # 续传帧依次为：起始标志、源MAC地址、目的MAC地址、是否为回复、文件个数、各文件的条目
+        # 查询的条目为8字节文件大小、8字节修改时间、2字节文件名长度与文件名，回复的条目为8字节偏移
+        header = (GbnConfig.RESUME_FLAG + self.src_mac_addr.to_bytes() + self.dst_mac_addr.to_bytes() +
+                  bytes([self.reply]) + len(self.entry_list).to_bytes(2, byteorder='big'))
+        if self.reply:
+            return header + b"".join(offset.to_bytes(8, byteorder='big') for offset in self.entry_list)
+        return header + b"".join(size.to_bytes(8, byteorder='big') + mtime.to_bytes(8, byteorder='big', signed=True) +
+                                 len(name).to_bytes(2, byteorder='big') + name
+                                 for name, size, mtime in self.entry_list)
+
+    @classmethod
+    def from_bytes(cls, frame_bytes):
+        """
+        Parse a resume frame.
+        :param frame_bytes: bytes-like object
+        :return:
+        """
+        frame_bytes = bytes(frame_bytes)
+        if len(frame_bytes) < cls.HEADER_SIZE:
+            raise ValueError('Invalid frame format')
+        reply = bool(frame_bytes[13])
+        count = int.from_bytes(frame_bytes[14:16], byteorder='big')
+        entry_list = []
+        offset = cls.HEADER_SIZE
+        for _ in range(count):
+            if reply:
+                entry_list.append(int.from_bytes(frame_bytes[offset:offset + 8], byteorder='big'))
+                offset += 8
+            else:
+                size = int.from_bytes(frame_bytes[offset:offset + 8], byteorder='big')
+                mtime = int.from_bytes(frame_bytes[offset + 8:offset + 16], byteorder='big', signed=True)
+                name_size = int.from_bytes(frame_bytes[offset + 16:offset + 18], byteorder='big')
+                entry_list.append((frame_bytes[offset + 18:offset + 18 + name_size], size, mtime))
+                offset += 18 + name_size
+            if offset > len(frame_bytes):
+                raise ValueError('Invalid frame format')
+        return cls(MACAddress.from_bytes(frame_bytes[1:7]), MACAddress.from_bytes(frame_bytes[7:13]), entry_list,
+                   reply)
+
+
+class FrameView:
+    """
+    A lightweight frame decoded lazily from a memoryview, only valid until the buffer is reused.
+    """
+    __slots__ = ("view", "payload_end")
+
+    def __init__(self, view: memoryview, checksum_size: int):
+        self.view = view
+        self.payload_end = len(view) - checksum_size
+
+    @property
+    def DATA_FRAME(self) -> bool:
+        return self.view[0] == GbnConfig.START_FLAG[0]
+
+    @property
+    def NAK_FRAME(self) -> bool:
+        return self.view[0] == GbnConfig.NAK_FLAG[0]
+
+    @property
+    def FEC_FRAME(self) -> bool:
+        return self.view[0] == GbnConfig.FEC_FLAG[0]
+
+    @property
+    def dst_bytes(self) -> memoryview:
+        return self.view[7:13]
+
+    @property
+    def src_mac_addr(self) -> MACAddress:
+        return MACAddress.from_bytes(self.view[1:7])
+
+    @property
+    def dst_mac_addr(self) -> MACAddress:
+        return MACAddress.from_bytes(self.view[7:13])
+
+    @property
+    def seq_num(self) -> int:
+        return int.from_bytes(self.view[13:13 + GbnConfig.SEQ_BIT_SIZE], byteorder='big')
+
+    @property
+    def payload(self) -> memoryview:
+        return self.view[13 + GbnConfig.SEQ_BIT_SIZE:self.payload_end]
+
+
 class FrameFactory:
     """
     A factory to encapsulate the frame.
     """
+    # 可按帧视图解析的帧
+    VIEW_FLAG_SET = frozenset(flag[0] for flag in (GbnConfig.START_FLAG, GbnConfig.ACK_FLAG, GbnConfig.NAK_FLAG,
+                                                   GbnConfig.FEC_FLAG))
 
     @staticmethod
-    def from_bytes(frame_bytes: bytes):
-        flag = frame_bytes[0]
-        # 从二进制格式的字节串中解析出序列号、确认号、数据和CRC校验码
-        crc_func = crcmod.predefined.mkCrcFun('crc-ccitt-false')
-        computed_crc = crc_func(frame_bytes[0:-2])
-        checksum = int.from_bytes(frame_bytes[-2:], byteorder='big')
-        if computed_crc != checksum:
-            raise CRCError('CRC error', frame_bytes, computed_crc, checksum)
-        if flag != int.from_bytes(GbnConfig.START_FLAG, byteorder='big') and flag != int.from_bytes(
-                GbnConfig.ACK_FLAG, byteorder='big'):
+    def direction(flag: int) -> int:
+        """
+        Get the direction of the session a received frame belongs to.
+        :param flag: the start flag of the frame
+        :return: SEND for ACK and NAK frames, RECEIVE for the others
+        """
+        if flag == GbnConfig.ACK_FLAG[0] or flag == GbnConfig.NAK_FLAG[0]:
+            return GbnChecksum.SEND
+        return GbnChecksum.RECEIVE
+
+    @staticmethod
+    def view(frame_view: memoryview) -> FrameView:
+        """
+        Check a received frame in place and wrap it without copying.
+        :param frame_view: memoryview of the received datagram
+        :return:
+        """
+        # 按与源地址协商的校验算法检查校验码
+        checksum = GbnChecksum.of(frame_view[1:7], FrameFactory.direction(frame_view[0]))
+        if len(frame_view) < 13 + GbnConfig.SEQ_BIT_SIZE + checksum.size or not checksum.verify(frame_view):
+            raise CRCError('CRC error', bytes(frame_view))
+        if frame_view[0] not in FrameFactory.VIEW_FLAG_SET:
             raise ValueError('Invalid frame format')
+        return FrameView(frame_view, checksum.size)
 
-        src_mac = MACAddress.from_bytes(frame_bytes[1:7])
-        dst_mac = MACAddress.from_bytes(frame_bytes[7:13])
-        seq_num = int.from_bytes(frame_bytes[13:13 + GbnConfig.SEQ_BIT_SIZE], byteorder='big')
-        payload = frame_bytes[13 + GbnConfig.SEQ_BIT_SIZE:-2]
-        if flag == int.from_bytes(GbnConfig.START_FLAG, byteorder='big'):
-            return GbnFrame(src_mac, dst_mac, seq_num, payload)
-        else:
-            return AckFrame(src_mac, dst_mac, seq_num)
+
+class ReadAhead:
+    """
+    A background thread reading and encoding the next frames of a window, so sliding the window only swaps buffers.
+    """
+
+    def __init__(self, window, point: int, depth: int):
+        """
+        Start reading ahead.
+        :param window: the GbnWindows bound to the file
+        :param point: the first point to read
+        :param depth: most frames kept ready
+        """
+        self.window = window
+        self.ready_queue = queue.Queue(depth)
+        # 预读线程持有一个缓冲区，其余最多depth个在就绪队列中
+        self.free_queue = queue.Queue()
+        for _ in range(depth + 1):
+            self.free_queue.put(window.new_buffer())
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(point,), daemon=True)
+        self.thread.start()
+
+    def run(self, point: int):
+        while True:
+            buffer = self.free_queue.get()
+            if buffer is None or self.stop_event.is_set():
+                return
+            try:
+                length = self.window.encode(buffer, point)
+            except Exception as e:
+                # 读取出错时交给窗口所在的线程抛出
+                self._put(e)
+                return
+            self._put((point, buffer, length, self.window.file_handle.progress))
+            if length == 0:
+                return
+            point += 1
+
+    def _put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.ready_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, point: int):
+        """
+        Take the next frame, waiting for the thread if it is not ready.
+        :param point: the point expected, frames are read strictly in order
+        :return: (buffer, length, progress), length is 0 if the file is over
+        """
+        item = self.ready_queue.get()
+        if isinstance(item, Exception):
+            raise item
+        ready_point, buffer, length, progress = item
+        if length and ready_point != point:
+            raise RuntimeError(f"Read ahead point {ready_point}, expected {point}")
+        return buffer, length, progress
+
+    def recycle(self, buffer: bytearray):
+        """
+        Give a buffer no longer used by the window back to the thread.
+        :param buffer:
+        :return:
+        """
+        self.free_queue.put(buffer)
+
+    def stop(self):
+        self.stop_event.set()
+        self.free_queue.put(None)
+
+
+class WindowStatus:
+    """
+    Status codes of the window slots, NAME_LIST gives the names used in the log.
+    """
+    NEW = 0
+    RT = 1
+    TO = 2
+    NAME_LIST = ("New", "RT", "TO")
 
 
 class GbnWindows:
@@ -114,19 +437,100 @@ class GbnWindows:
     A class to encapsulate a GBN sliding window.
     """
 
-    def __init__(self, dst_mac: MACAddress) -> None:
+    def __init__(self, dst_mac: MACAddress, data_size: int = None) -> None:
+        """
+        Initialize the window.
+        :param dst_mac:
+        :param data_size: length of the data field, default is DataSize
+        """
         self.src_mac = GbnConfig.MAC_ADDRESS
         self.dst_mac = dst_mac
-        self.windows_list = [{"time": 0.0, "data": b"", "type": "New"} for _ in range(0, GbnConfig.SW_SIZE + 1)]
-        self.unused_point = (GbnConfig.INIT_SEQ_NO + GbnConfig.SW_SIZE) % (GbnConfig.SW_SIZE + 1)
+        self.data_size = data_size or GbnConfig.DATA_SIZE
+        # 窗口中的帧以不回绕的绝对序号(point)表示，point对size取模得到其所在的槽位
+        # 只有写入帧中的序列号才对序列号空间取模
+        self.size = GbnConfig.SW_SIZE + 1
+        # 窗口状态以并列数组保存：发送时间、状态码和帧数据
+        self.time_list = array.array('d', bytes(8 * self.size))
+        self.status_list = bytearray(self.size)
+        # 选择重传时记录各帧是否已被单独确认
+        self.acked_list = bytearray(self.size)
+        # 记录各帧是否被重传过，重传过的帧不用于测量RTT
+        self.retrans_list = bytearray(self.size)
+        self.rtt = RttEstimator()
+        # 所有在途帧的超时时刻
+        self.timer = TimerHeap()
+        self.data_list = [b""] * self.size
+        # 每个槽位对应一个预先分配的帧缓冲区，帧头模板只写入一次
+        self.checksum = GbnChecksum.of(dst_mac.to_bytes(), GbnChecksum.SEND)
+        self.header = GbnConfig.START_FLAG + self.src_mac.to_bytes() + dst_mac.to_bytes()
+        self.payload_offset = len(self.header) + GbnConfig.SEQ_BIT_SIZE
+        self.buffer_list = [self.new_buffer() for _ in range(self.size)]
+        self.read_ahead = None
+        self.unused_point = GbnConfig.INIT_SEQ_NO - 1
         self.file_handle = None
         self.if_end = False
         self.file_end_point = -1
         self.send_count = 0
         self.pbar = None
         self.total_byte = 0
+        self.progress = 0
         self.batch_size = 0
 
+    def encode(self, buffer: bytearray, point: int) -> int:
+        """
+        Read the next payload into a frame buffer and encode the frame of the point in place.
+        :param buffer: frame buffer starting with the header
+        :param point:
+        :return: length of the frame, 0 if the file is over
+        """
+        view = memoryview(buffer)
+        view[len(self.header):self.payload_offset] = (point % GbnConfig.SEQ_SPACE).to_bytes(
+            GbnConfig.SEQ_BIT_SIZE, byteorder='big')
+        size = self.file_handle.read_into(view[self.payload_offset:self.payload_offset + self.data_size])
+        if size == 0:
+            return 0
+        end = self.payload_offset + size
+        # 校验码从缓存的帧头前缀继续计算，直接写入缓冲区
+        view[end:end + self.checksum.size] = self.checksum.checksum(view[len(self.header):end], self.header)
+        return end + self.checksum.size
+
+    def new_buffer(self) -> bytearray:
+        """
+        Create a frame buffer with the header written.
+        :return:
+        """
+        buffer = bytearray(self.payload_offset + self.data_size + self.checksum.size)
+        buffer[:len(self.header)] = self.header
+        return buffer
+
+    def _fill(self, point: int) -> bool:
+        """
+        Put the frame of the point into its slot, read ahead or encoded in place.
+        :param point:
+        :return: False if the file is over
+        """
+        slot = point % self.size
+        if self.read_ahead is None:
+            length = self.encode(self.buffer_list[slot], point)
+            progress = self.file_handle.progress
+        else:
+            # 换入预先编码好的缓冲区，换出的缓冲区交还给预读线程
+            buffer, length, progress = self.read_ahead.get(point)
+            if length:
+                self.read_ahead.recycle(self.buffer_list[slot])
+                self.buffer_list[slot] = buffer
+        if length == 0:
+            return False
+        self.data_list[slot] = memoryview(self.buffer_list[slot])[:length]
+        self.status_list[slot] = WindowStatus.NEW
+        self.acked_list[slot] = 0
+        self.retrans_list[slot] = 0
+        with GbnConfig.print_lock:
+            # 打包的帧含有多个记录，以读取的文件名与数据字节数计算进度
+            self.pbar.update(progress - self.progress)
+        self.progress = progress
+        return True
+
     def bind_file(self, file_handle: FileReader):
         """
         Bind a file to the window.
@@ -138,26 +542,20 @@ class GbnWindows:
         #     total=len(file_handle.file_path_list) + math.ceil(file_handle.file_size / (GbnConfig.DATA_SIZE - 1)),
         #     desc='Processing',
         #     unit='BUF')
-        self.total_byte = len(file_handle.file_path) + file_handle.file_size
+        self.total_byte = file_handle.total_size
         self.pbar = tqdm.tqdm(total=self.total_byte,
                               desc=f'Sending:{file_handle.file_path}',
                               unit='Bytes')
-        self.batch_size = GbnConfig.DATA_SIZE - 1
-        seq = GbnConfig.INIT_SEQ_NO
-        while seq != self.unused_point:
-            payload = next(self.file_handle)
+        self.batch_size = self.data_size - 1
+        if GbnConfig.READ_AHEAD:
+            self.read_ahead = ReadAhead(self, self.begin_point, GbnConfig.READ_AHEAD)
+        for point in range(self.begin_point, self.begin_point + GbnConfig.SW_SIZE):
             self.send_count += 1
-            if payload is not None:
-                self.windows_list[seq]["data"] = GbnFrame(self.src_mac, self.dst_mac, seq, payload).frame_bytes
-                self.windows_list[seq]["type"] = "New"
-                with GbnConfig.print_lock:
-                    self.pbar.update(len(payload) - 1)
-            else:
-                self.file_end_point = seq
+            if not self._fill(point):
+                self.file_end_point = point
                 self.if_end = True
                 self.send_count -= 1
                 break
-            seq = (seq + 1) % (GbnConfig.SW_SIZE + 1)
 
     def slide(self, ack_num: int):
         """
@@ -165,25 +563,22 @@ class GbnWindows:
         :param ack_num: Slide the window
         :return:
         """
+        # 取消已确认帧的计时
+        for point in range(self.unused_point + 1, ack_num + 1):
+            self.timer.cancel(point)
+        # 已确认帧的槽位装入其后一个窗口的帧
         tmp_point = self.unused_point
         while tmp_point != ack_num and not self.if_end:
-            self.windows_list[tmp_point]["time"] = 0.0
-            payload = next(self.file_handle)
+            self.time_list[tmp_point % self.size] = 0.0
             self.send_count += 1
-            if payload is not None:
-                self.windows_list[tmp_point]["data"] = GbnFrame(self.src_mac, self.dst_mac, tmp_point,
-                                                                payload).frame_bytes
-                self.windows_list[tmp_point]["type"] = "New"
-                with GbnConfig.print_lock:
-                    self.pbar.update(len(payload) - 1)
-            else:
+            if not self._fill(tmp_point + self.size):
                 self.if_end = True
-                self.file_end_point = tmp_point
+                self.file_end_point = tmp_point + self.size
                 self.send_count -= 1
                 break
-            tmp_point = (tmp_point + 1) % (GbnConfig.SW_SIZE + 1)
-        self.windows_list[tmp_point]["time"] = 0.0
-        self.windows_list[tmp_point]["data"] = b""
+            tmp_point += 1
+        self.time_list[tmp_point % self.size] = 0.0
+        self.data_list[tmp_point % self.size] = b""
         self.unused_point = ack_num
 
     @property
@@ -192,26 +587,75 @@ class GbnWindows:
         Get the beginning point of the window.
         :return:
         """
-        return (self.unused_point + 1) % (GbnConfig.SW_SIZE + 1)
+        return self.unused_point + 1
+
+    def slot(self, point: int) -> int:
+        """
+        Get the slot of the point in the window arrays.
+        :param point:
+        :return:
+        """
+        return point % self.size
+
+    def to_point(self, seq_num: int) -> int:
+        """
+        Get the point of a sequence number in a received ACK, counted forward from the last acknowledged point.
+        :param seq_num: sequence number in the frame
+        :return:
+        """
+        return self.unused_point + (seq_num - self.unused_point) % GbnConfig.SEQ_SPACE
 
     def start_timing(self, point: int):
         """
-        Start timing for the point.
+        Start timing for the point, the deadline is the current timeout after now.
         :param point:
         :return:
         """
-        self.windows_list[point]["time"] = time.time()
+        slot = point % self.size
+        if self.time_list[slot] != 0.0:
+            self.retrans_list[slot] = 1
+        now = time.monotonic()
+        self.time_list[slot] = now
+        self.timer.push(point, now + self.rtt.rto)
+
+    def measure(self, point: int):
+        """
+        Take an RTT sample from the ACK of the point if the frame was sent only once.
+        :param point:
+        :return:
+        """
+        slot = point % self.size
+        stime = self.time_list[slot]
+        if stime != 0.0 and not self.retrans_list[slot]:
+            self.rtt.sample(time.monotonic() - stime)
 
     @property
     def check(self) -> bool:
         """
-        Check if the window is timeout.
+        Check that no frame in flight is timeout.
         :return:
         """
-        stime = self.windows_list[self.begin_point]["time"]
-        if stime == 0.0 or (time.time() - stime) * 1000 <= GbnConfig.TIME_OUT:
-            return True
-        return False
+        deadline = self.timer.peek()
+        return deadline is None or time.monotonic() <= deadline
+
+    @property
+    def time_left(self):
+        """
+        Get the seconds left before the first frame in flight is timeout.
+        :return: None if no frame is timing
+        """
+        deadline = self.timer.peek()
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    @property
+    def finished(self) -> bool:
+        """
+        Check if the last frame of the file is acknowledged.
+        :return:
+        """
+        return self.if_end and self.unused_point == self.file_end_point - 1
 
     def get_data(self, point: int):
         """
@@ -219,33 +663,44 @@ class GbnWindows:
         :param point:
         :return:
         """
-        return self.windows_list[point]["data"]
+        return self.data_list[point % self.size]
 
-    def get_status(self, point: int):
+    def get_payload(self, point: int):
         """
-        Get the status of the point.
+        Get the data field in the frame of the point.
         :param point:
         :return:
         """
-        return self.windows_list[point]["type"]
+        data = self.data_list[point % self.size]
+        return data[self.payload_offset:len(data) - self.checksum.size]
+
+    def get_status(self, point: int) -> int:
+        """
+        Get the status code of the point.
+        :param point:
+        :return: a WindowStatus code
+        """
+        return self.status_list[point % self.size]
 
-    def set_status(self, point: int, status: str = "TO"):
+    def set_status(self, point: int, status: int = WindowStatus.TO):
         """
-        Set the status of the point.
+        Set the status code of the point.
         :param point:
-        :param status: default is "TO"
+        :param status: a WindowStatus code, default is TO
         :return:
         """
-        self.windows_list[point]["type"] = status
+        self.status_list[point % self.size] = status
 
     def __len__(self):
         return GbnConfig.SW_SIZE
 
     def close_pbar(self):
         """
-        Close the progress bar in the terminal.
+        Close the progress bar in the terminal, and stop reading ahead.
         :return:
         """
+        if self.read_ahead is not None:
+            self.read_ahead.stop()
         if self.pbar is not None:
             with GbnConfig.print_lock:
                 self.pbar.update(0)
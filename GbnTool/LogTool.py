@@ -52,21 +52,23 @@ class GbnLog:
             GbnLog._receive_logger.addHandler(stream_handler)
 
     @staticmethod
-    def send_log(num: int, pdu_to_send: int, status: str, ack_no: int):
+    def send_log(num: int, pdu_to_send: int, status: str, ack_no: int, cwnd: int = None):
         """
         Log the send information.
         :param num:
         :param pdu_to_send:
         :param status:
         :param ack_no:
+        :param cwnd: the congestion window, appended at the end of the record
         :return:
         """
+        message = f"(No:{num})(pdu_to_send:{pdu_to_send})(status:{status})(ackedNo:{ack_no})"
+        if cwnd is not None:
+            message += f"(cwnd:{cwnd})"
         if status == "New":
-            GbnLog._send_logger.info(f"(No:{num})(pdu_to_send:{pdu_to_send})(status:{status})(ackedNo:{ack_no})",
-                                     extra={"net_type": "Send"})
+            GbnLog._send_logger.info(message, extra={"net_type": "Send"})
         else:
-            GbnLog._send_logger.warning(f"(No:{num})(pdu_to_send:{pdu_to_send})(status:{status})(ackedNo:{ack_no})",
-                                        extra={"net_type": "Send"})
+            GbnLog._send_logger.warning(message, extra={"net_type": "Send"})
 
     @staticmethod
     def send_done(num: int, pdu_count: int, file_name: str, mac_addr: MACAddress):
@@ -0,0 +1,126 @@
+#   Copyright 2023 Gaozih/Gzh0821 https://github.com/Gzh0821
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from GbnTool import time
+from GbnTool.ConfigTool import GbnConfig
+
+
+# 发送速率控制工具，使数据帧均匀发出而不是一次性发出整个窗口
+
+class TokenBucket:
+    """
+    A token bucket, tokens are added at a fixed rate up to the burst size and may go below zero.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        """
+        Initialize the token bucket.
+        :param rate: tokens added per second
+        :param burst: most tokens the bucket holds
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """
+        Get the seconds to wait before amount tokens are available.
+        :param amount:
+        :param now: time.monotonic() based time
+        :return: 0 if they are available now
+        """
+        self._refill(now)
+        if self.tokens >= min(amount, self.burst):
+            return 0.0
+        return (min(amount, self.burst) - self.tokens) / self.rate
+
+    def consume(self, amount: float, now: float):
+        """
+        Take tokens from the bucket.
+        :param amount:
+        :param now: time.monotonic() based time
+        :return:
+        """
+        self._refill(now)
+        self.tokens -= amount
+
+
+class GbnPacer:
+    """
+    Pace the data frames of a send session by bytes and packets per second.
+    In auto mode the byte rate follows the congestion window and the smoothed RTT.
+    """
+    # 自动模式下速率为每个RTT发送一个拥塞窗口的数据再乘以该系数，避免速率低于ACK时钟
+    AUTO_GAIN = 1.25
+
+    def __init__(self, frame_size: int):
+        """
+        Initialize the pacer from the config.
+        :param frame_size: size of a full data frame in bytes
+        """
+        self.frame_size = frame_size
+        burst = GbnConfig.PACE_BURST
+        self.byte_bucket = TokenBucket(GbnConfig.PACE_RATE, burst * frame_size) if GbnConfig.PACE_RATE else None
+        self.packet_bucket = TokenBucket(GbnConfig.PACE_PACKETS, burst) if GbnConfig.PACE_PACKETS else None
+        self.auto_bucket = None
+
+    def update(self, cwnd: int, srtt):
+        """
+        Set the rate of the auto mode.
+        :param cwnd: congestion window in frames
+        :param srtt: smoothed RTT in seconds, None if not measured yet
+        :return:
+        """
+        if not GbnConfig.PACE_AUTO or not srtt:
+            return
+        rate = self.AUTO_GAIN * cwnd * self.frame_size / srtt
+        if self.auto_bucket is None:
+            self.auto_bucket = TokenBucket(rate, GbnConfig.PACE_BURST * self.frame_size)
+        else:
+            self.auto_bucket.rate = rate
+
+    def delay(self, size: int) -> float:
+        """
+        Get the seconds to wait before a frame may be sent.
+        :param size: frame size in bytes
+        :return: 0 if it may be sent now
+        """
+        now = time.monotonic()
+        delay = 0.0
+        if self.byte_bucket is not None:
+            delay = max(delay, self.byte_bucket.delay(size, now))
+        if self.auto_bucket is not None:
+            delay = max(delay, self.auto_bucket.delay(size, now))
+        if self.packet_bucket is not None:
+            delay = max(delay, self.packet_bucket.delay(1, now))
+        return delay
+
+    def consume(self, size: int):
+        """
+        Account a frame sent.
+        :param size: frame size in bytes
+        :return:
+        """
+        now = time.monotonic()
+        if self.byte_bucket is not None:
+            self.byte_bucket.consume(size, now)
+        if self.auto_bucket is not None:
+            self.auto_bucket.consume(size, now)
+        if self.packet_bucket is not None:
+            self.packet_bucket.consume(1, now)
@@ -23,12 +23,12 @@ class GbnRandom:
     def init(error_rate: int, lost_rate: int):
         """
         Initial Random Engine.
-        :param error_rate: error_rate num (1/n)
-        :param lost_rate: lost_rate num (1/n)
+        :param error_rate: error_rate num (1/n), 0 for no error
+        :param lost_rate: lost_rate num (1/n), 0 for no loss
         :return:
         """
-        GbnRandom.error_rate = 1.0 / error_rate
-        GbnRandom.lost_rate = 1.0 / lost_rate
+        GbnRandom.error_rate = 1.0 / error_rate if error_rate else 0.0
+        GbnRandom.lost_rate = 1.0 / lost_rate if lost_rate else 0.0
 
     @staticmethod
     def random_error(data: bytes) -> bytes:
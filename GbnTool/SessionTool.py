@@ -0,0 +1,1106 @@
+#   Copyright 2023 Gaozih/Gzh0821 https://github.com/Gzh0821
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from GbnTool import queue, threading, time
+from GbnTool.AddrTool import MACAddress
+from GbnTool.CheckTool import GbnChecksum
+from GbnTool.CongestionTool import CongestionWindow
+from GbnTool.ConfigTool import GbnConfig
+from GbnTool.FileTool import FileReader, FileWriter
+from GbnTool.FrameTool import AckFrame, FecFrame, FrameFactory, GbnWindows, NakFrame, ProbeFrame, ResumeFrame, \
+    SyncFrame, WindowStatus
+from GbnTool.LogTool import GbnLog
+from GbnTool.PaceTool import GbnPacer
+
+
+# 与线程、事件循环无关的GBN会话逻辑，由UdpTool与AsyncTool驱动
+# 传输对象需提供send(data, error, ack, addr)、receive_count与clear_receive_count()
+
+class SendSession:
+    """
+    The sender side of a GBN transfer.
+    """
+    ARQ_MODE = GbnConfig.ARQ_GBN
+    # 探测的数据报长度，对应常见路径MTU下不分片的最长UDP数据报
+    PROBE_SIZE_LIST = (GbnConfig.MAX_DATAGRAM_SIZE, 32768, 16384, 8972, 4096, 1472, 548)
+    # 同步帧未得到回复时的重发次数，之后视为不回复同步帧的接收方，继续传输
+    SYNC_RETRY = 5
+
+    def __init__(self, udp_handle, dst_mac: MACAddress, file_handle: FileReader, dest_addr=None):
+        """
+        Initialize the send session.
+        :param udp_handle: transport used to send frames
+        :param dst_mac: destination MAC address
+        :param file_handle: the FileReader Iterator
+        :param dest_addr: (ip, port) of the receiver, default is the destination of the transport
+        """
+        self.udp_handle = udp_handle
+        self.dst_mac = dst_mac
+        self.dest_addr = dest_addr
+        self.file_handle = file_handle
+        self.send_count = 0
+        # 窗口按协商的校验算法预先编码帧，需先登记
+        GbnChecksum.bind(dst_mac.to_bytes(), GbnChecksum.default.algorithm, GbnChecksum.SEND)
+        self.congestion = CongestionWindow(self.max_window)
+        # 同步帧的截止时刻，收到回复前不进行续传查询、探测或发送数据
+        self.sync_deadline = None
+        self.sync_count = 0
+        # 数据帧的发送速率控制，因速率受限而等待时记录需等待的秒数
+        self.pacer = None
+        self.pace_wait = None
+        # 探测最长帧时，窗口在探测结束后按选定的数据字段长度建立
+        self.window = None
+        self.probe_deadline = None
+        self.probe_dict = {}
+        self.probe_best = None
+        # 续传查询的截止时刻，收到回复或超时后才开始发送数据
+        self.resume_deadline = None
+        if not GbnConfig.MTU_PROBE:
+            self.open_window(GbnConfig.DATA_SIZE)
+        # seq为下一个要发送的帧，sent_point为发出过的帧之后的位置，均为窗口中的绝对序号
+        self.seq = None
+        self.sent_point = None
+        # 重复ack计数，快速重传后直到窗口移动前不再计数
+        self.dup_ack_count = 0
+        self.recovering = False
+        # 前向纠错：fec_point为下一个首次发送的帧，按发送顺序累积当前组的数据字段与长度的异或
+        self.fec_point = None
+        self.fec_first = None
+        self.fec_count = 0
+        self.fec_parity = 0
+        self.fec_length = 0
+        self.fec_size = 0
+
+    def open_window(self, data_size: int):
+        """
+        Create the window and the pacer for a length of the data field.
+        :param data_size:
+        :return:
+        """
+        # 为校验帧多出的字段留出空间，使其与数据帧一样不超过选定的帧长
+        if GbnConfig.FEC_GROUP:
+            data_size -= FecFrame.HEADER_SIZE
+        self.window = GbnWindows(self.dst_mac, data_size)
+        self.pacer = GbnPacer(self.window.payload_offset + data_size + self.window.checksum.size)
+
+    @property
+    def max_window(self) -> int:
+        """
+        Get the most frames the ARQ mode allows in flight.
+        :return:
+        """
+        return GbnConfig.SW_SIZE
+
+    def distance(self, point: int) -> int:
+        """
+        Get the distance from the beginning point of the window to the point.
+        :param point:
+        :return:
+        """
+        return point - self.window.begin_point
+
+    @property
+    def sync_bytes(self) -> bytes:
+        """
+        Get the SYNC frame which resets the receiver.
+        :return:
+        """
+        # 同步帧携带本机的校验算法、重传方式与窗口大小，双方在本次传输中使用
+        return SyncFrame(GbnConfig.MAC_ADDRESS, self.dst_mac, GbnChecksum.default.algorithm,
+                         self.ARQ_MODE, self.max_window).frame_bytes
+
+    def start(self):
+        """
+        Send the SYNC frame, the rest of the setup waits for its reply.
+        :return:
+        """
+        self.sync_count = 0
+        self.send_sync()
+
+    def send_sync(self):
+        """
+        Send the SYNC frame and wait one Timeout for its reply.
+        :return:
+        """
+        self.sync_count += 1
+        self.udp_handle.send(self.sync_bytes, False, addr=self.dest_addr)
+        self.sync_deadline = time.monotonic() + GbnConfig.TIME_OUT / 1000
+
+    def on_sync(self):
+        """
+        Handle the reply of the SYNC frame, then ask for the resume offsets, probe the frame size or fill the window.
+        :return:
+        """
+        if self.sync_deadline is None:
+            return
+        self.sync_deadline = None
+        if GbnConfig.RESUME:
+            self.start_resume()
+        if self.window is None:
+            self.start_probe()
+        self.try_bind()
+
+    def try_bind(self):
+        """
+        Fill the window once the window is opened and the resume offsets are known.
+        :return:
+        """
+        if self.window is not None and self.sync_deadline is None and self.resume_deadline is None and \
+                self.seq is None:
+            self.bind_file()
+
+    def bind_file(self):
+        """
+        Fill the window with the file.
+        :return:
+        """
+        self.window.bind_file(self.file_handle)
+        self.seq = self.sent_point = self.fec_point = self.window.begin_point
+
+    def start_probe(self):
+        """
+        Send one probe frame for each candidate length of the data field, largest first.
+        Receivers accept datagrams of any length, so the probe only measures the path.
+        :return:
+        """
+        overhead = 13 + GbnConfig.SEQ_BIT_SIZE + GbnChecksum.of(self.dst_mac.to_bytes(), GbnChecksum.SEND).size
+        data_size_set = {GbnConfig.DATA_SIZE}
+        for size in self.PROBE_SIZE_LIST:
+            if 1 < size - overhead < GbnConfig.DATA_SIZE and size >= ProbeFrame.HEADER_SIZE:
+                data_size_set.add(size - overhead)
+        # 以数据报长度为键，回复中携带的是接收到的数据报长度
+        self.probe_dict = {data_size + overhead: data_size for data_size in data_size_set}
+        for size in sorted(self.probe_dict, reverse=True):
+            probe_frame = ProbeFrame(GbnConfig.MAC_ADDRESS, self.dst_mac, size)
+            self.udp_handle.send(probe_frame.frame_bytes, False, addr=self.dest_addr)
+        self.probe_deadline = time.monotonic() + GbnConfig.TIME_OUT / 1000
+
+    def on_probe(self, size: int):
+        """
+        Handle the reply of a probe frame.
+        :param size: size of the probe frame received by the receiver
+        :return:
+        """
+        if self.window is not None or size not in self.probe_dict:
+            return
+        data_size = self.probe_dict[size]
+        if self.probe_best is None or data_size > self.probe_best:
+            self.probe_best = data_size
+        # 最长的探测帧已通过，无需再等待
+        if data_size == max(self.probe_dict.values()):
+            self.finish_probe()
+
+    def finish_probe(self):
+        """
+        Open the window with the longest data field that passed, or the shortest one if none passed.
+        :return:
+        """
+        data_size = self.probe_best or min(self.probe_dict.values())
+        GbnConfig.print(f"[INFO] Probe finished, DataSize of the transfer: {data_size}.")
+        self.probe_deadline = None
+        self.open_window(data_size)
+        self.try_bind()
+
+    def start_resume(self):
+        """
+        Ask the receiver how many bytes of each file it has committed.
+        :return:
+        """
+        entry_list = []
+        size = ResumeFrame.HEADER_SIZE
+        # 查询不超过数据帧的长度，放不下的文件从头发送
+        for name, file_size, mtime in self.file_handle.identity_list():
+            size += ResumeFrame.entry_size(name)
+            if size > GbnConfig.MAX_FRAME_SIZE:
+                break
+            entry_list.append((name, file_size, mtime))
+        resume_frame = ResumeFrame(GbnConfig.MAC_ADDRESS, self.dst_mac, entry_list)
+        self.udp_handle.send(resume_frame.frame_bytes, False, addr=self.dest_addr)
+        self.resume_deadline = time.monotonic() + GbnConfig.TIME_OUT / 1000
+
+    def on_resume(self, offset_list: list):
+        """
+        Handle the reply of the resume query.
+        :param offset_list: offsets to continue each file from
+        :return:
+        """
+        if self.resume_deadline is None:
+            return
+        self.resume_deadline = None
+        if any(offset_list):
+            GbnConfig.print(f"[INFO] Resume from offsets: {offset_list}.")
+        self.file_handle.resume(offset_list)
+        self.try_bind()
+
+    def probing(self) -> bool:
+        """
+        Send the SYNC frame again, finish the probe and the resume query if they are timeout.
+        :return: True if the window is not filled yet
+        """
+        now = time.monotonic()
+        if self.sync_deadline is not None:
+            if now < self.sync_deadline:
+                return True
+            if self.sync_count <= self.SYNC_RETRY:
+                self.send_sync()
+                return True
+            GbnConfig.print(f"[WARNING] No reply to SYNC from {self.dst_mac}, continue with the options sent.")
+            self.file_handle.announce_size = False
+            self.on_sync()
+        if self.window is None and now >= self.probe_deadline:
+            self.finish_probe()
+        # 接收方不支持续传时不会回复，从头发送
+        if self.resume_deadline is not None and now >= self.resume_deadline:
+            self.on_resume([])
+        return self.seq is None
+
+    @property
+    def finished(self) -> bool:
+        return self.window is not None and self.window.finished
+
+    @property
+    def time_left(self):
+        """
+        Get the seconds the sender may sleep before the next timeout, or until the pacer allows sending.
+        :return:
+        """
+        if self.seq is None:
+            deadline = min(deadline for deadline in (self.sync_deadline, self.probe_deadline, self.resume_deadline)
+                           if deadline is not None)
+            return max(0.0, deadline - time.monotonic())
+        time_left = self.window.time_left
+        if self.pace_wait is None:
+            return time_left
+        return self.pace_wait if time_left is None else min(time_left, self.pace_wait)
+
+    def paced(self, point: int) -> bool:
+        """
+        Check if the pacer holds back the frame of the point.
+        :param point:
+        :return:
+        """
+        delay = self.pacer.delay(len(self.window.get_data(point)))
+        if delay > 0:
+            self.pace_wait = delay
+            return True
+        return False
+
+    def on_ack(self, ack_num: int, nak: bool = False):
+        """
+        Slide the window with a cumulative ACK, go back at once on duplicate ACKs or a NAK.
+        :param ack_num: sequence number in the frame
+        :param nak: ack_num is the sequence number the receiver is waiting for
+        :return:
+        """
+        # NAK表明其前一帧已被确认，并请求从期待的帧开始重传
+        if self.seq is None:
+            return
+        point = self.window.to_point(ack_num - 1 if nak else ack_num)
+        # 确认未发出过的帧的ack是过期的ack回绕所致，忽略
+        if point >= self.sent_point:
+            return
+        if point == self.window.unused_point:
+            # 重复ack说明窗口首帧之后的帧已到达而首帧丢失
+            if not nak and GbnConfig.DUP_ACK_THRESHOLD and self.in_flight and not self.recovering:
+                self.dup_ack_count += 1
+                if self.dup_ack_count >= GbnConfig.DUP_ACK_THRESHOLD:
+                    self.fast_retransmit()
+        else:
+            self.dup_ack_count = 0
+            self.recovering = False
+            self.congestion.on_ack(point - self.window.unused_point)
+            self.window.measure(point)
+            self.window.slide(point)
+            # 回退后尚未重发到的帧已被确认，从窗口首帧继续发送
+            if self.seq < self.window.begin_point:
+                self.seq = self.window.begin_point
+        if nak and self.in_flight and not self.recovering:
+            self.fast_retransmit()
+
+    @property
+    def in_flight(self) -> bool:
+        """
+        Check if any frame is sent and not acknowledged.
+        :return:
+        """
+        return self.seq > self.window.begin_point and not self.window.finished
+
+    def go_back(self, timeout: bool = True):
+        """
+        Send again from the beginning point of the window.
+        :param timeout: the beginning frame keeps its TO status, otherwise all frames are marked RT
+        :return:
+        """
+        # 回退后在途帧都将重发，旧的计时全部作废
+        self.window.timer.clear()
+        # 将所有非超时重传置为RT
+        begin_point = self.window.begin_point
+        for point in range(begin_point + 1 if timeout else begin_point, self.seq):
+            self.window.set_status(point, WindowStatus.RT)
+        self.seq = begin_point
+
+    def fast_retransmit(self):
+        """
+        Go back without waiting for the timeout.
+        :return:
+        """
+        self.recovering = True
+        self.dup_ack_count = 0
+        self.congestion.on_loss(self.distance(self.seq), timeout=False)
+        self.go_back(timeout=False)
+
+    def pump(self):
+        """
+        Go back on timeout and send every frame the window allows.
+        :return:
+        """
+        self.pace_wait = None
+        if self.probing() or self.window.finished:
+            return
+        self.pacer.update(self.congestion.window, self.window.rtt.srtt)
+        # 超时
+        if not self.window.check:
+            self.window.rtt.backoff()
+            self.congestion.on_loss(self.distance(self.seq), timeout=True)
+            self.go_back()
+        # 发送数据帧，在途帧数不超过拥塞窗口
+        while not (self.window.if_end and self.seq == self.window.file_end_point) and \
+                self.distance(self.seq) < self.congestion.window and not self.paced(self.seq):
+            self.send_frame(self.seq)
+            self.seq += 1
+        # 文件的最后一组不满FecGroup帧，在其最后一帧发出后补发校验帧
+        if self.fec_count and self.window.if_end and self.fec_point == self.window.file_end_point:
+            self.send_parity()
+
+    def send_frame(self, point: int):
+        """
+        Send the frame of the point and start timing.
+        :param point:
+        :return:
+        """
+        data = self.window.get_data(point)
+        self.udp_handle.send(data, addr=self.dest_addr)
+        self.pacer.consume(len(data))
+        self.send_count += 1
+        self.sent_point = max(self.sent_point, point + 1)
+        # 日志中记录帧中的序列号
+        GbnLog.send_log(self.send_count, point % GbnConfig.SEQ_SPACE,
+                        WindowStatus.NAME_LIST[self.window.get_status(point)],
+                        self.window.unused_point % GbnConfig.SEQ_SPACE, self.congestion.window)
+        self.window.set_status(point)
+        self.window.start_timing(point)
+        # 重传的帧不再计入校验组
+        if GbnConfig.FEC_GROUP and point == self.fec_point:
+            self.add_parity(point)
+
+    def add_parity(self, point: int):
+        """
+        Add the frame of the point to the parity of its group, and send the parity frame when the group is full.
+        :param point:
+        :return:
+        """
+        payload = self.window.get_payload(point)
+        if not self.fec_count:
+            self.fec_first = point
+        # 以小端序转为整数，较短的数据字段相当于在末尾补0
+        self.fec_parity ^= int.from_bytes(payload, byteorder='little')
+        self.fec_length ^= len(payload)
+        self.fec_size = max(self.fec_size, len(payload))
+        self.fec_count += 1
+        self.fec_point += 1
+        if self.fec_count == GbnConfig.FEC_GROUP:
+            self.send_parity()
+
+    def send_parity(self):
+        """
+        Send the parity frame of the current group and start a new group.
+        :return:
+        """
+        parity = self.fec_parity.to_bytes(self.fec_size, byteorder='little')
+        fec_frame = FecFrame(GbnConfig.MAC_ADDRESS, self.dst_mac, self.fec_first % GbnConfig.SEQ_SPACE,
+                             self.fec_count, self.fec_length, parity)
+        data = fec_frame.frame_bytes
+        # 校验帧与数据帧一样可能出错或丢失，但不计入数据帧的发送次数
+        self.udp_handle.send(data, ack=True, addr=self.dest_addr)
+        self.pacer.consume(len(data))
+        self.fec_count = self.fec_parity = self.fec_length = self.fec_size = 0
+
+    def close(self):
+        """
+        Log the result and close the progress bar.
+        :return:
+        """
+        if self.window is None:
+            # 探测或续传查询尚未结束时被取消，或start出错，还没有发出数据帧
+            return
+        GbnLog.send_done(self.send_count, self.window.send_count, self.file_handle.file_path, self.dst_mac)
+        self.window.close_pbar()
+
+
+class SelectiveSendSession(SendSession):
+    """
+    The sender side of a Selective Repeat transfer, only the frames not acknowledged are sent again.
+    """
+    ARQ_MODE = GbnConfig.ARQ_SR
+
+    def __init__(self, udp_handle, dst_mac: MACAddress, file_handle: FileReader, dest_addr=None):
+        super().__init__(udp_handle, dst_mac, file_handle, dest_addr)
+        # 已超时但因速率受限尚未重传的帧
+        self.retrans_queue = []
+
+    @property
+    def max_window(self) -> int:
+        return GbnConfig.SR_SIZE
+
+    def on_ack(self, ack_num: int, nak: bool = False):
+        """
+        Mark a frame acknowledged and slide the window over the acknowledged frames at its beginning.
+        A NAK, or enough ACKs of later frames, sends the missing frame again at once.
+        :param ack_num: sequence number in the frame
+        :param nak: ack_num is the sequence number the receiver is waiting for
+        :return:
+        """
+        if self.seq is None:
+            return
+        ack_point = self.window.to_point(ack_num)
+        # 忽略不在途的帧的确认，过期的ack回绕后不会落在在途帧中
+        if ack_point == self.window.unused_point or ack_point >= self.seq or \
+                self.window.acked_list[self.window.slot(ack_point)]:
+            return
+        if nak:
+            self.resend(ack_point)
+            return
+        self.congestion.on_ack()
+        self.window.measure(ack_point)
+        self.window.acked_list[self.window.slot(ack_point)] = 1
+        self.window.timer.cancel(ack_point)
+        point = self.window.begin_point
+        last_point = None
+        while point != self.seq and self.window.acked_list[self.window.slot(point)]:
+            last_point = point
+            point += 1
+        if last_point is not None:
+            self.dup_ack_count = 0
+            self.window.slide(last_point)
+        elif GbnConfig.DUP_ACK_THRESHOLD:
+            # 窗口首帧之后的帧被确认，首帧仍未确认
+            self.dup_ack_count += 1
+            # 首帧已因否认帧或超时重传过时不再重传
+            if self.dup_ack_count == GbnConfig.DUP_ACK_THRESHOLD and \
+                    not self.window.retrans_list[self.window.slot(self.window.begin_point)]:
+                self.resend(self.window.begin_point)
+
+    def resend(self, point: int):
+        """
+        Send a frame again without waiting for its timeout.
+        :param point:
+        :return:
+        """
+        self.congestion.on_loss(self.distance(self.seq), timeout=False)
+        self.window.set_status(point, WindowStatus.RT)
+        self.send_frame(point)
+
+    def pump(self):
+        """
+        Send the timeout frames again and send new frames within the SR window and the congestion window.
+        :return:
+        """
+        self.pace_wait = None
+        if self.probing() or self.window.finished:
+            return
+        self.pacer.update(self.congestion.window, self.window.rtt.srtt)
+        # 逐帧检查超时，只重传超时的帧
+        point_list = self.window.timer.pop_expired(time.monotonic())
+        if point_list:
+            self.window.rtt.backoff()
+            self.congestion.on_loss(self.distance(self.seq), timeout=True)
+            self.retrans_queue.extend(point_list)
+        while self.retrans_queue:
+            point = self.retrans_queue[0]
+            # 排队期间已被确认的帧不再重传
+            if point < self.window.begin_point or self.window.acked_list[self.window.slot(point)]:
+                self.retrans_queue.pop(0)
+                continue
+            if self.paced(point):
+                return
+            self.retrans_queue.pop(0)
+            self.send_frame(point)
+        # 发送新的数据帧
+        while not (self.window.if_end and self.seq == self.window.file_end_point) and \
+                self.distance(self.seq) < self.congestion.window and not self.paced(self.seq):
+            self.send_frame(self.seq)
+            self.seq += 1
+        # 文件的最后一组不满FecGroup帧，在其最后一帧发出后补发校验帧
+        if self.fec_count and self.window.if_end and self.fec_point == self.window.file_end_point:
+            self.send_parity()
+
+
+def new_send_session(udp_handle, dst_mac: MACAddress, file_handle: FileReader, dest_addr=None) -> SendSession:
+    """
+    Create the send session of the configured ARQ mode.
+    :param udp_handle:
+    :param dst_mac:
+    :param file_handle:
+    :param dest_addr:
+    :return:
+    """
+    if GbnConfig.ARQ_MODE == GbnConfig.ARQ_SR:
+        return SelectiveSendSession(udp_handle, dst_mac, file_handle, dest_addr)
+    return SendSession(udp_handle, dst_mac, file_handle, dest_addr)
+
+
+class ReceiveSession:
+    """
+    The receiver side of a GBN transfer from one source.
+    """
+
+    def __init__(self, receiver, src_mac: MACAddress, window_size: int = 0):
+        """
+        Initialize the reception session.
+        :param receiver: the GbnReceiver owns the session
+        :param src_mac: MAC address of the sender
+        :param window_size: window of the sender from its SYNC frame, 0 to use the local config
+        """
+        self.receiver = receiver
+        self.src_mac = src_mac
+        # 两端的SWSize可以不同，按发送方的窗口接收
+        self.window_size = min(window_size, self.max_window_size) if window_size else self.default_window_size
+        self.expect_seq = GbnConfig.INIT_SEQ_NO
+        self.write_handle = FileWriter()
+        # 对当前期望的帧是否已发送过否认帧
+        self.nak_sent = False
+        # 尚未确认的按序帧个数、延迟确认的截止时刻与确认帧的目的地址
+        self.ack_pending = 0
+        self.ack_deadline = None
+        self.ack_addr = None
+        # 当前凑满多少个按序帧即确认，从逐帧确认开始，不超过AckEvery与发送窗口
+        self.ack_limit = 1
+        # 收到第一个校验帧后开始缓存数据字段的副本，fec_ahead为其中乱序到达、尚未交付的帧
+        self.fec_cache = None
+        self.fec_ahead = set()
+
+    @property
+    def default_window_size(self) -> int:
+        """
+        Get how far ahead of the expected frame a frame may be sent, if the sender does not tell it.
+        :return:
+        """
+        return GbnConfig.SW_SIZE
+
+    @property
+    def max_window_size(self) -> int:
+        """
+        Get the largest window the sequence space allows.
+        :return:
+        """
+        return GbnConfig.SEQ_SPACE - 1
+
+    def deliver(self, seq_num: int, payload):
+        """
+        Write an in-order payload to the file, or hand it to the write stage of the receiver.
+        :param seq_num:
+        :param payload:
+        :return: whether any file is finished
+        """
+        udp_handle = self.receiver.udp_handle
+        self.expect_seq = (self.expect_seq + 1) % GbnConfig.SEQ_SPACE
+        self.nak_sent = False
+        write_stage = self.receiver.write_stage
+        if write_stage is None:
+            finished = bool(self.write(seq_num, payload, udp_handle.receive_count))
+        else:
+            # 只检查是否含有结束记录以便立即确认，接收缓冲区会被复用，需复制后排队
+            finished = any(len(record) and record[0] == GbnConfig.FILE_END_FLAG[0]
+                           for record in FileWriter.unpack(payload))
+            write_stage.put(self, seq_num, bytes(payload), udp_handle.receive_count)
+        if finished:
+            udp_handle.clear_receive_count()
+        return finished
+
+    def write(self, seq_num: int, payload, receive_count: int) -> list:
+        """
+        Write the records of a payload and log them.
+        :param seq_num:
+        :param payload:
+        :param receive_count: count of the frames received when the payload was delivered
+        :return: list of (count of the records, file path) of the files finished
+        """
+        # 一帧中可能打包了多个记录，甚至多个文件
+        result = -1
+        done_list = []
+        for record in FileWriter.unpack(payload):
+            result, finish_flag = self.write_handle.write(record)
+            if finish_flag is not None:
+                done_list.append((result, finish_flag))
+        GbnLog.receive_log(receive_count, seq_num, seq_num, pdu_count=result)
+        for result, finish_flag in done_list:
+            GbnConfig.print(f"[INFO] file:{finish_flag} receive over!\n")
+            GbnLog.receive_done(receive_count, result, finish_flag, self.src_mac)
+        return done_list
+
+    def nak(self, force: bool = False) -> list:
+        """
+        Ask for the expected frame once, until it arrives.
+        :param force: ask even if the frame may still be rebuilt from a parity frame
+        :return: the NAK reply, or an empty list if NAK is disabled or has been sent
+        """
+        # 使用前向纠错时，缺口先等待校验帧恢复，无法恢复时才请求重传
+        if not GbnConfig.NAK or self.nak_sent or (self.fec_cache is not None and not force):
+            return []
+        self.nak_sent = True
+        return [(self.expect_seq, True)]
+
+    def delay_ack(self, ack_num: int, finished: bool) -> list:
+        """
+        Acknowledge every ack_limit in-order frames, or when a file is finished.
+        The sender sends no more than its congestion window, which is 1 or 2 frames at the start and after a
+        timeout, so ack_limit follows the frames in flight instead of waiting for AckEvery frames that never come:
+        it starts at 1, grows by one each time it is reached, is cut to the frames gathered when the AckDelay timer
+        fires, and falls back to 1 after a gap or a duplicate frame.
+        :param ack_num:
+        :param finished: whether the frame finished a file
+        :return: list of (ack_num, nak) to send back
+        """
+        self.ack_pending += 1
+        if finished or self.ack_pending >= self.ack_limit:
+            if self.ack_pending >= self.ack_limit:
+                # 凑满说明在途帧不少于ack_limit个，放宽一帧
+                self.ack_limit = min(self.ack_limit + 1, GbnConfig.ACK_EVERY, self.window_size)
+            self.ack_pending = 0
+            self.ack_deadline = None
+            return [(ack_num, False)]
+        # 凑不满时由定时器在AckDelay后补发
+        if self.ack_deadline is None:
+            self.ack_deadline = time.monotonic() + GbnConfig.ACK_DELAY / 1000
+        return []
+
+    def flush(self) -> list:
+        """
+        Acknowledge the in-order frames held back by delay_ack.
+        :return: list of (ack_num, nak) to send back
+        """
+        self.ack_deadline = None
+        if not self.ack_pending:
+            return []
+        # 定时器到期说明在途帧不足ack_limit个，以已凑到的帧数为准
+        self.ack_limit = self.ack_pending
+        self.ack_pending = 0
+        return [((self.expect_seq - 1) % GbnConfig.SEQ_SPACE, False)]
+
+    def accept(self, seq_num: int, payload) -> list:
+        """
+        Handle a data frame.
+        :param seq_num:
+        :param payload: only used until this call returns
+        :return: list of (ack_num, nak) to send back
+        """
+        # 若接收到的包与要接收的序号相同
+        if seq_num == self.expect_seq:
+            # 数据以memoryview形式直接交给写文件工具，不再复制
+            return self.delay_ack(seq_num, self.deliver(seq_num, payload))
+        GbnLog.receive_log(self.receiver.udp_handle.receive_count, self.expect_seq, seq_num, "NoErr")
+        # 乱序帧立即确认，重复确认同时覆盖了被延迟的确认
+        self.ack_pending = 0
+        self.ack_deadline = None
+        # 出现缺口或重复帧时发送方将重传并缩小拥塞窗口，恢复逐帧确认，避免合并的确认丢失后只能等待超时
+        self.ack_limit = 1
+        # 出现缺口时先发送一次否认帧，之后回复重复确认
+        return self.nak() or [((self.expect_seq - 1) % GbnConfig.SEQ_SPACE, False)]
+
+    def resume(self, entry_list: list) -> list:
+        """
+        Answer a resume query from the checkpoints of the files.
+        :param entry_list: list of (name, size, modification time) from the sender
+        :return: offsets to continue each file from
+        """
+        offset_list = []
+        for name, size, mtime in entry_list:
+            try:
+                file_path = name.decode()
+            except UnicodeDecodeError:
+                offset_list.append(0)
+                continue
+            # 以文件名、大小与发送方的修改时间识别同一文件，写入时据此记录检查点
+            identity = f"{size}:{mtime}"
+            self.write_handle.identity_dict[file_path] = identity
+            offset_list.append(FileWriter.load_checkpoint(file_path, identity))
+        return offset_list
+
+    def receive(self, seq_num: int, payload) -> list:
+        """
+        Handle a data frame, keeping a copy of it once the sender sends parity frames.
+        :param seq_num:
+        :param payload: only used until this call returns
+        :return: list of (ack_num, nak) to send back
+        """
+        if self.fec_cache is None:
+            return self.accept(seq_num, payload)
+        # 接收缓冲区会被复用，需复制后缓存
+        self.cache(seq_num, bytes(payload))
+        return self.accept_cached(seq_num)
+
+    def cache(self, seq_num: int, payload: bytes):
+        """
+        Keep the data field of a frame for the parity frames, only the latest frames are kept.
+        :param seq_num:
+        :param payload:
+        :return:
+        """
+        # 重新插入使字典保持接收顺序，序列号空间至少为窗口的两倍，旧的一轮序列号不会被误用
+        self.fec_cache.pop(seq_num, None)
+        self.fec_cache[seq_num] = payload
+        if len(self.fec_cache) > 2 * self.window_size:
+            oldest_seq = next(iter(self.fec_cache))
+            del self.fec_cache[oldest_seq]
+            self.fec_ahead.discard(oldest_seq)
+
+    def accept_cached(self, seq_num: int) -> list:
+        """
+        Handle a cached data frame, the frames out of order are kept and delivered once the gap is filled.
+        :param seq_num:
+        :return: list of (ack_num, nak) to send back
+        """
+        distance = (seq_num - self.expect_seq) % GbnConfig.SEQ_SPACE
+        if distance:
+            if distance < self.window_size:
+                self.fec_ahead.add(seq_num)
+            return self.accept(seq_num, self.fec_cache[seq_num])
+        reply_list = self.accept(seq_num, self.fec_cache[seq_num])
+        while self.expect_seq in self.fec_ahead:
+            seq_num = self.expect_seq
+            self.fec_ahead.discard(seq_num)
+            # 累积确认只需回复最后一个
+            reply_list = self.accept(seq_num, self.fec_cache[seq_num]) or reply_list
+        return reply_list
+
+    def on_parity(self, first_seq: int, count: int, length: int, parity) -> list:
+        """
+        Rebuild the only missing frame of a group from its parity frame.
+        :param first_seq: sequence number of the first frame in the group
+        :param count: count of the frames in the group
+        :param length: XOR of the lengths of the data fields
+        :param parity: XOR of the data fields
+        :return: list of (ack_num, nak) to send back
+        """
+        if self.fec_cache is None:
+            # 此前的帧未缓存，从下一组开始恢复
+            self.fec_cache = {}
+            return []
+        seq_list = [(first_seq + i) % GbnConfig.SEQ_SPACE for i in range(count)]
+        missing_list = [seq_num for seq_num in seq_list if seq_num not in self.fec_cache]
+        if len(missing_list) != 1 or \
+                (missing_list[0] - self.expect_seq) % GbnConfig.SEQ_SPACE >= self.window_size:
+            # 组内缺失多帧时无法恢复，请求重传期待的帧
+            return self.nak(force=True) if self.expect_seq in missing_list else []
+        value = int.from_bytes(parity, byteorder='little')
+        for seq_num in seq_list:
+            if seq_num != missing_list[0]:
+                payload = self.fec_cache[seq_num]
+                value ^= int.from_bytes(payload, byteorder='little')
+                length ^= len(payload)
+        seq_num = missing_list[0]
+        if length > len(parity) or value.bit_length() > 8 * len(parity):
+            GbnLog.receive_log(self.receiver.udp_handle.receive_count, self.expect_seq, seq_num, "DataErr",
+                               "ReceiveFEC")
+            return []
+        GbnLog.receive_log(self.receiver.udp_handle.receive_count, self.expect_seq, seq_num, "OK", "ReceiveFEC")
+        self.cache(seq_num, value.to_bytes(len(parity), byteorder='little')[:length])
+        return self.accept_cached(seq_num)
+
+
+class SelectiveReceiveSession(ReceiveSession):
+    """
+    The receiver side of a Selective Repeat transfer, frames out of order are kept until the gap is filled.
+    """
+
+    def __init__(self, receiver, src_mac: MACAddress, window_size: int = 0):
+        super().__init__(receiver, src_mac, window_size)
+        self.buffer_dict = {}
+
+    @property
+    def default_window_size(self) -> int:
+        return GbnConfig.SR_SIZE
+
+    @property
+    def max_window_size(self) -> int:
+        # 窗口不超过序列号空间的一半，窗口前后的序列号才不会重叠
+        return max(1, GbnConfig.SEQ_SPACE // 2)
+
+    def accept_cached(self, seq_num: int) -> list:
+        # 乱序帧由接收窗口缓存
+        return self.accept(seq_num, self.fec_cache[seq_num])
+
+    def accept(self, seq_num: int, payload) -> list:
+        """
+        Handle a data frame and acknowledge it alone.
+        :param seq_num:
+        :param payload: only used until this call returns
+        :return: list of (ack_num, nak) to send back, empty if the frame is ignored
+        """
+        distance = (seq_num - self.expect_seq) % GbnConfig.SEQ_SPACE
+        if distance == 0:
+            self.deliver(seq_num, payload)
+            # 交付缓存中已连续的帧
+            while self.expect_seq in self.buffer_dict:
+                self.deliver(self.expect_seq, self.buffer_dict.pop(self.expect_seq))
+        elif distance < self.window_size:
+            # 乱序到达的帧需复制后缓存，接收缓冲区会被复用
+            if seq_num not in self.buffer_dict:
+                self.buffer_dict[seq_num] = bytes(payload)
+            GbnLog.receive_log(self.receiver.udp_handle.receive_count, self.expect_seq, seq_num, "OK", "ReceiveBuffer")
+            return [(seq_num, False)] + self.nak()
+        elif distance < GbnConfig.SEQ_SPACE // 2:
+            # 超出接收窗口的后续帧未被缓存，不能确认，发送方会重传
+            GbnLog.receive_log(self.receiver.udp_handle.receive_count, self.expect_seq, seq_num, "NoErr")
+            return []
+        # 窗口之前的帧都已交付，其确认可能丢失，需再次确认
+        return [(seq_num, False)]
+
+
+class WriteStage:
+    """
+    A thread writing the delivered payloads to the files, so the receiving thread never waits for the disk.
+    """
+
+    def __init__(self, depth: int):
+        """
+        Start the write stage.
+        :param depth: most payloads waiting to be written, the receiving thread waits when it is full
+        """
+        self.queue = queue.Queue(depth)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, session: ReceiveSession, seq_num: int, payload: bytes, receive_count: int):
+        self.queue.put((session, seq_num, payload, receive_count))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            session, seq_num, payload, receive_count = item
+            try:
+                session.write(seq_num, payload, receive_count)
+            except Exception as e:
+                # 写入出错时线程继续取出队列中的帧，接收线程不会因队列满而阻塞
+                GbnConfig.print(f"[ERROR] Write error: {e}.")
+
+    def close(self):
+        """
+        Write the payloads in the queue and stop the thread.
+        :return:
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+
+class GbnReceiver:
+    """
+    Dispatch received datagrams to the reception sessions of each source.
+    """
+
+    def __init__(self, udp_handle, ack_callback, probe_callback=None, resume_callback=None, sync_callback=None):
+        """
+        Initialize the receiver.
+        :param udp_handle: transport used to send ACK frames
+        :param ack_callback: called with (src_mac, ack_num, nak) when an ACK or NAK frame is received
+        :param probe_callback: called with (src_mac, size) when the reply of a probe frame is received
+        :param resume_callback: called with (src_mac, offset_list) when the reply of a resume query is received
+        :param sync_callback: called with (src_mac) when the reply of a SYNC frame is received
+        """
+        self.udp_handle = udp_handle
+        self.ack_callback = ack_callback
+        self.probe_callback = probe_callback
+        self.resume_callback = resume_callback
+        self.sync_callback = sync_callback
+        self.session_dict = {}
+        # 有延迟确认待发送的会话
+        self.delayed_dict = {}
+        # 写入磁盘的流水线阶段，未配置时在接收线程中直接写入
+        self.write_stage = WriteStage(GbnConfig.WRITE_QUEUE) if GbnConfig.WRITE_QUEUE else None
+
+    def close(self):
+        """
+        Wait for the payloads still being written.
+        :return:
+        """
+        if self.write_stage is not None:
+            self.write_stage.close()
+            self.write_stage = None
+
+    @property
+    def time_left(self):
+        """
+        Seconds until the next delayed ACK is due.
+        :return: None if no ACK is delayed
+        """
+        if not self.delayed_dict:
+            return None
+        deadline = min(session.ack_deadline for session in self.delayed_dict.values())
+        return max(deadline - time.monotonic(), 0)
+
+    def poll(self):
+        """
+        Send the delayed ACKs that are due.
+        :return:
+        """
+        if not self.delayed_dict:
+            return
+        now = time.monotonic()
+        for src_mac, session in list(self.delayed_dict.items()):
+            if session.ack_deadline is None or session.ack_deadline <= now:
+                del self.delayed_dict[src_mac]
+                self.reply(session, session.flush())
+
+    def reply(self, session: ReceiveSession, reply_list: list):
+        """
+        Send ACK and NAK frames to the source of a session.
+        :param session:
+        :param reply_list: list of (ack_num, nak)
+        :return:
+        """
+        for ack_num, nak in reply_list:
+            frame_class = NakFrame if nak else AckFrame
+            ack_frame = frame_class(src_mac=GbnConfig.MAC_ADDRESS, dst_mac=session.src_mac, ack_num=ack_num)
+            self.udp_handle.send(ack_frame.frame_bytes, ack=True, addr=session.ack_addr)
+
+    def handle_probe(self, rec_data, rec_addr=None):
+        """
+        Reply a probe frame received in full, or hand a reply to the sender.
+        :param rec_data:
+        :param rec_addr:
+        :return:
+        """
+        try:
+            probe_frame = ProbeFrame.from_bytes(rec_data)
+        except ValueError:
+            return
+        if probe_frame.dst_mac_addr != GbnConfig.MAC_ADDRESS:
+            return
+        if probe_frame.reply:
+            if self.probe_callback is not None:
+                self.probe_callback(probe_frame.src_mac_addr, probe_frame.size)
+        elif len(rec_data) == probe_frame.size:
+            # 被截断的探测帧不回复
+            reply_frame = ProbeFrame(GbnConfig.MAC_ADDRESS, probe_frame.src_mac_addr, probe_frame.size, reply=True)
+            self.udp_handle.send(reply_frame.frame_bytes, False, addr=rec_addr)
+
+    def handle_resume(self, rec_data, rec_addr=None):
+        """
+        Answer a resume query, or hand a reply to the sender.
+        :param rec_data:
+        :param rec_addr:
+        :return:
+        """
+        try:
+            resume_frame = ResumeFrame.from_bytes(rec_data)
+        except ValueError:
+            return
+        if resume_frame.dst_mac_addr != GbnConfig.MAC_ADDRESS:
+            return
+        src_mac = resume_frame.src_mac_addr
+        if resume_frame.reply:
+            if self.resume_callback is not None:
+                self.resume_callback(src_mac, resume_frame.entry_list)
+            return
+        # 查询紧随同步帧之后，写入时需用到查询中的文件标识
+        session = self.session_dict.get(src_mac)
+        if session is None:
+            session = ReceiveSession(self, src_mac)
+            self.session_dict[src_mac] = session
+        reply_frame = ResumeFrame(GbnConfig.MAC_ADDRESS, src_mac, session.resume(resume_frame.entry_list), reply=True)
+        self.udp_handle.send(reply_frame.frame_bytes, False, addr=rec_addr)
+
+    def handle(self, rec_data, rec_addr=None):
+        """
+        Handle a received datagram.
+        :param rec_data: bytes-like object, only used until this call returns
+        :param rec_addr: address of the sender, ACK frames are sent back to it
+        :return:
+        """
+        if len(rec_data) < 13:
+            GbnLog.receive_log(self.udp_handle.receive_count, -1, -1, "DataErr", "ReceiveError")
+            return
+        if rec_data[0] == GbnConfig.SYNC_FLAG[0]:
+            sync_frame = SyncFrame.from_bytes(rec_data)
+            if sync_frame.dst_mac_addr == GbnConfig.MAC_ADDRESS and sync_frame.reply:
+                if self.sync_callback is not None:
+                    self.sync_callback(sync_frame.src_mac_addr)
+            elif sync_frame.dst_mac_addr == GbnConfig.MAC_ADDRESS:
+                # 记录对端选择的校验算法，按其重传方式重置该源地址的接收会话
+                GbnChecksum.bind(sync_frame.src_mac_addr.to_bytes(), sync_frame.checksum, GbnChecksum.RECEIVE)
+                if sync_frame.checksum == GbnChecksum.NONE and GbnConfig.ERROR_RATE:
+                    # 本端产生的位错误会进入无校验的确认帧
+                    GbnConfig.print(f"[WARNING] {sync_frame.src_mac_addr} sends without checksum, "
+                                    f"the errors of ErrorRate in the ACKs will not be detected.")
+                GbnConfig.init(reset=True)
+                if sync_frame.arq_mode == GbnConfig.ARQ_SR:
+                    session = SelectiveReceiveSession(self, sync_frame.src_mac_addr, sync_frame.window_size)
+                else:
+                    session = ReceiveSession(self, sync_frame.src_mac_addr, sync_frame.window_size)
+                self.session_dict[sync_frame.src_mac_addr] = session
+                self.delayed_dict.pop(sync_frame.src_mac_addr, None)
+                # 回复同步帧，发送方收到后才开始传输，重发的同步帧同样回复
+                reply_frame = SyncFrame(GbnConfig.MAC_ADDRESS, sync_frame.src_mac_addr, sync_frame.checksum,
+                                        sync_frame.arq_mode, sync_frame.window_size, reply=True)
+                self.udp_handle.send(reply_frame.frame_bytes, False, addr=rec_addr)
+                GbnConfig.print(f"[WARNING] Reset Config.")
+            return
+        if rec_data[0] == GbnConfig.PROBE_FLAG[0]:
+            self.handle_probe(rec_data, rec_addr)
+            return
+        if rec_data[0] == GbnConfig.RESUME_FLAG[0]:
+            self.handle_resume(rec_data, rec_addr)
+            return
+        # 检查CRC纠错码，帧内各字段在使用时才从缓冲区中解析
+        try:
+            rec_frame = FrameFactory.view(rec_data)
+        except ValueError:
+            GbnLog.receive_log(self.udp_handle.receive_count, -1, -1, "DataErr", "ReceiveError")
+            return
+
+        # 若非发给本机的包，跳过
+        if rec_frame.dst_bytes != GbnConfig.MAC_ADDRESS.mac_bytes:
+            GbnLog.receive_log(self.udp_handle.receive_count, -1, -1, "AddrErr", "ReceiveError")
+            return
+        src_mac = rec_frame.src_mac_addr
+        seq_num = rec_frame.seq_num
+        # 若为确认帧或否认帧
+        if not rec_frame.DATA_FRAME and not rec_frame.FEC_FRAME:
+            nak = rec_frame.NAK_FRAME
+            GbnLog.receive_log(self.udp_handle.receive_count, -1, seq_num, "OK", "ReceiveNAK" if nak else "ReceiveACK")
+            self.ack_callback(src_mac, seq_num, nak)
+            return
+        # 若第一次接收包，登记入接收map中
+        session = self.session_dict.get(src_mac)
+        if session is None:
+            session = ReceiveSession(self, src_mac)
+            self.session_dict[src_mac] = session
+        session.ack_addr = rec_addr
+        if rec_frame.FEC_FRAME:
+            payload = rec_frame.payload
+            if len(payload) < FecFrame.HEADER_SIZE:
+                GbnLog.receive_log(self.udp_handle.receive_count, -1, -1, "DataErr", "ReceiveError")
+                return
+            reply_list = session.on_parity(seq_num, payload[0], int.from_bytes(payload[1:3], byteorder='big'),
+                                           payload[3:])
+        else:
+            reply_list = session.receive(seq_num, rec_frame.payload)
+        # 发送确认帧与否认帧
+        self.reply(session, reply_list)
+        if session.ack_deadline is None:
+            self.delayed_dict.pop(src_mac, None)
+        else:
+            self.delayed_dict[src_mac] = session
@@ -0,0 +1,124 @@
+#   Copyright 2023 Gaozih/Gzh0821 https://github.com/Gzh0821
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from GbnTool import heapq
+from GbnTool.ConfigTool import GbnConfig
+
+
+# 计时相关工具
+
+class RttEstimator:
+    """
+    Estimate the retransmission timeout from measured RTT samples.
+    """
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self):
+        # 配置的超时时间作为初始值与上限
+        self.max_rto = GbnConfig.TIME_OUT / 1000
+        self.min_rto = min(GbnConfig.MIN_TIME_OUT / 1000, self.max_rto)
+        self.rto = self.max_rto
+        self.srtt = None
+        self.rttvar = None
+
+    def sample(self, rtt: float):
+        """
+        Update the smoothed RTT with a sample, only frames sent once may be measured.
+        :param rtt: seconds between sending a frame and receiving its ACK
+        :return:
+        """
+        if not GbnConfig.ADAPTIVE_TIME_OUT:
+            return
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = min(self.max_rto, max(self.min_rto, self.srtt + 4 * self.rttvar))
+
+    def backoff(self):
+        """
+        Double the timeout after a timeout, until the next valid sample.
+        :return:
+        """
+        self.rto = min(self.max_rto, self.rto * 2)
+
+
+class TimerHeap:
+    """
+    A min-heap of deadlines keyed by window point, canceled entries are removed lazily.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entry_dict = {}
+        self._counter = 0
+
+    def push(self, key: int, deadline: float):
+        """
+        Start or restart the timer of a key.
+        :param key:
+        :param deadline: time.monotonic() based deadline
+        :return:
+        """
+        self.cancel(key)
+        # 计数器保证相同截止时间的条目按加入顺序比较，不比较键
+        self._counter += 1
+        entry = [deadline, self._counter, key, True]
+        self._entry_dict[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, key: int):
+        """
+        Cancel the timer of a key in O(1), the entry stays in the heap until it reaches the top.
+        :param key:
+        :return:
+        """
+        entry = self._entry_dict.pop(key, None)
+        if entry is not None:
+            entry[3] = False
+
+    def peek(self):
+        """
+        Get the earliest deadline.
+        :return: None if no timer is running
+        """
+        heap = self._heap
+        while heap and not heap[0][3]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_expired(self, now: float) -> list:
+        """
+        Remove and return the keys whose deadline is not later than now.
+        :param now:
+        :return:
+        """
+        key_list = []
+        heap = self._heap
+        while heap and (not heap[0][3] or heap[0][0] <= now):
+            entry = heapq.heappop(heap)
+            if entry[3]:
+                del self._entry_dict[entry[2]]
+                key_list.append(entry[2])
+        return key_list
+
+    def clear(self):
+        self._heap.clear()
+        self._entry_dict.clear()
+
+    def __len__(self):
+        return len(self._entry_dict)
@@ -12,31 +12,192 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
-from GbnTool import socket, threading, errno
+from GbnTool import os, socket, sys, threading, errno, selectors
 from GbnTool.AddrTool import MACAddress
 from GbnTool.ConfigTool import GbnConfig
-from GbnTool.ErrorTool import CRCError
-from GbnTool.FileTool import FileWriter, FileReader
-from GbnTool.FrameTool import AckFrame, FrameFactory, GbnWindows
-from GbnTool.LogTool import GbnLog
+from GbnTool.FileTool import FileReader
 from GbnTool.RandomTool import GbnRandom
+from GbnTool.SessionTool import GbnReceiver, new_send_session
 
-# 存储接收线程接收到的ack包，交给发送线程移动窗口
-ack_get_dict = {}
-ack_get_dict_lock = threading.Lock()
+
+class AckChannel:
+    """
+    Deliver the ACKs of a session from the reception thread to the sender.
+    """
+
+    def __init__(self, cumulative: bool = True):
+        """
+        Initialize the ACK channel.
+        :param cumulative: keep only the newest ACK, otherwise every ACK is kept in order, NAKs are always kept
+        """
+        self._condition = threading.Condition()
+        self._ack_list = []
+        self._probe_list = []
+        self._resume_list = []
+        self._sync_count = 0
+        self.cumulative = cumulative
+
+    def put(self, ack_num: int, nak: bool = False):
+        """
+        Store an ACK and wake up the sender.
+        :param ack_num:
+        :param nak: whether it is a NAK
+        :return:
+        """
+        with self._condition:
+            if self.cumulative and not nak and self._ack_list and not self._ack_list[-1][1]:
+                self._ack_list[-1] = (ack_num, nak)
+            else:
+                self._ack_list.append((ack_num, nak))
+            self._condition.notify()
+
+    def put_probe(self, size: int):
+        """
+        Store the reply of a probe frame and wake up the sender.
+        :param size:
+        :return:
+        """
+        with self._condition:
+            self._probe_list.append(size)
+            self._condition.notify()
+
+    def get_probe(self) -> list:
+        """
+        Take the stored replies of probe frames.
+        :return: list of sizes
+        """
+        with self._condition:
+            probe_list, self._probe_list = self._probe_list, []
+            return probe_list
+
+    def put_resume(self, offset_list: list):
+        """
+        Store the reply of a resume query and wake up the sender.
+        :param offset_list:
+        :return:
+        """
+        with self._condition:
+            self._resume_list.append(offset_list)
+            self._condition.notify()
+
+    def get_resume(self) -> list:
+        """
+        Take the stored replies of resume queries.
+        :return: list of offset lists
+        """
+        with self._condition:
+            resume_list, self._resume_list = self._resume_list, []
+            return resume_list
+
+    def put_sync(self):
+        """
+        Store the reply of a SYNC frame and wake up the sender.
+        :return:
+        """
+        with self._condition:
+            self._sync_count += 1
+            self._condition.notify()
+
+    def get_sync(self) -> int:
+        """
+        Take the count of the stored replies of SYNC frames.
+        :return:
+        """
+        with self._condition:
+            sync_count, self._sync_count = self._sync_count, 0
+            return sync_count
+
+    def get(self, timeout=None) -> list:
+        """
+        Take the stored ACKs, wait at most timeout seconds if there is none.
+        :param timeout: None to wait forever, 0 to return at once
+        :return: list of (ack_num, nak), empty if timeout
+        """
+        with self._condition:
+            if not self._ack_list and not self._probe_list and not self._resume_list and not self._sync_count and \
+                    timeout != 0:
+                self._condition.wait(timeout)
+            ack_list, self._ack_list = self._ack_list, []
+            return ack_list
+
+
+# 每个发送会话的ack通道，接收线程将收到的ack交给对应的发送线程移动窗口
+ack_channel_dict = {}
+ack_channel_dict_lock = threading.Lock()
+
+
+# Linux下报告接收队列溢出丢弃的数据报数的套接字选项，socket模块未提供该常量
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40) if sys.platform.startswith("linux") else None
+
+
+def proc_drop_count(udp_socket: socket.socket) -> int:
+    """
+    Get the count of datagrams the kernel dropped for a socket from /proc/net/udp.
+    Used where the datagrams are not read by recvmsg, so SO_RXQ_OVFL can not be used.
+    :param udp_socket:
+    :return: 0 if the count is not available
+    """
+    if not sys.platform.startswith("linux"):
+        return 0
+    try:
+        inode = str(os.fstat(udp_socket.fileno()).st_ino)
+        with open("/proc/net/udp") as proc_file:
+            for line in proc_file:
+                field_list = line.split()
+                # inode为第10列，drops为最后一列
+                if len(field_list) > 12 and field_list[9] == inode:
+                    return int(field_list[-1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def set_buffer_size(udp_socket: socket.socket):
+    """
+    Set the kernel buffer sizes of a socket from the config.
+    :param udp_socket:
+    :return:
+    """
+    for option, size in ((socket.SO_SNDBUF, GbnConfig.SEND_BUFFER), (socket.SO_RCVBUF, GbnConfig.RECEIVE_BUFFER)):
+        if size:
+            udp_socket.setsockopt(socket.SOL_SOCKET, option, size)
+            # 内核可能调整设定值，以实际值为准
+            actual = udp_socket.getsockopt(socket.SOL_SOCKET, option)
+            if actual < size:
+                GbnConfig.print(f"[WARNING] Socket buffer is limited to {actual} bytes by the system.")
 
 
 class UDPCommunication:
+    # 发送缓冲区满时等待其可写的最长时间(秒)，超时后该数据报视为丢失
+    SEND_WAIT_TIMEOUT = 1.0
+
     def __init__(self, bind_port: int):
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         if bind_port:
             self.udp_socket.bind(("", bind_port))
         GbnConfig.print(f"[INFO] UDP socket bind to port: {bind_port}.")
         self.udp_socket.setblocking(False)
+        set_buffer_size(self.udp_socket)
         self.dest_addr = None
         self.dest_port = None
         self.send_count = 0
         self.receive_count = 0
+        # 因发送缓冲区满而丢弃的数据报数与内核接收队列溢出丢弃的数据报数
+        self.send_drop_count = 0
+        self.kernel_drop_count = 0
+        self._send_lock = threading.Lock()
+        self._write_selector = None
+        # 接收缓冲区只分配一次，每次接收的数据报都读入其中
+        # 按最大UDP数据报分配，对端的DataSize大于本端时帧也不会被截断
+        self.receive_buffer = bytearray(GbnConfig.MAX_DATAGRAM_SIZE)
+        self.receive_view = memoryview(self.receive_buffer)
+        self.ancillary_size = 0
+        if SO_RXQ_OVFL is not None:
+            try:
+                self.udp_socket.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.ancillary_size = socket.CMSG_SPACE(4)
+            except OSError:
+                pass
 
     def set_dest(self, dest_addr: str, dest_port: int):
         """
@@ -58,41 +219,79 @@ class UDPCommunication:
         """
         return cls(bind_addr)
 
-    def send(self, send_data: bytes, error: bool = True, ack: bool = False):
+    def send(self, send_data: bytes, error: bool = True, ack: bool = False, addr=None):
         """
         Send data to the destination.
         :param send_data:
         :param error:
         :param ack:
+        :param addr: (ip, port) to send to, default is the destination set by set_dest
         :return:
         """
+        if addr is None:
+            addr = (self.dest_addr, self.dest_port)
         if error:
             # 依据概率参数随机产生位错误
             data = GbnRandom.random_error(send_data)
             if GbnRandom.keep():
                 # 依据概率参数模拟送达或丢失
-                self.udp_socket.sendto(data, (self.dest_addr, self.dest_port))
+                self.sendto(data, addr)
             if not ack:
                 self.send_count += 1
         else:
-            self.udp_socket.sendto(send_data, (self.dest_addr, self.dest_port))
+            self.sendto(send_data, addr)
 
-    def receive(self, buf_size: int = (5012 + GbnConfig.SEQ_BIT_SIZE * 2)):
+    def sendto(self, data, addr):
         """
-        Receive data from the destination.
-        :param buf_size:
+        Send a datagram, wait for the socket to be writable if the kernel send buffer is full.
+        :param data:
+        :param addr:
+        :return: False if the datagram is dropped
+        """
+        try:
+            self.udp_socket.sendto(data, addr)
+            return True
+        except BlockingIOError:
+            pass
+        # 收发线程共用套接字，等待可写的过程需互斥
+        with self._send_lock:
+            if self._write_selector is None:
+                self._write_selector = selectors.DefaultSelector()
+                self._write_selector.register(self.udp_socket, selectors.EVENT_WRITE)
+            while self._write_selector.select(self.SEND_WAIT_TIMEOUT):
+                try:
+                    self.udp_socket.sendto(data, addr)
+                    return True
+                except BlockingIOError:
+                    continue
+        self.send_drop_count += 1
+        return False
+
+    def receive_into(self):
+        """
+        Receive data into the reusable buffer without copying.
+        The returned memoryview is only valid until the next call.
         :return:
         """
         try:
-            rec_data, rec_addr = self.udp_socket.recvfrom(buf_size)
+            if self.ancillary_size:
+                size, ancillary, _, rec_addr = self.udp_socket.recvmsg_into([self.receive_buffer],
+                                                                            self.ancillary_size)
+                for level, kind, data in ancillary:
+                    if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                        # 内核报告的是该套接字累计丢弃的数据报数
+                        self.kernel_drop_count = int.from_bytes(data[:4], sys.byteorder)
+            else:
+                size, rec_addr = self.udp_socket.recvfrom_into(self.receive_buffer)
         except socket.error as e:
             if e.errno != errno.EWOULDBLOCK:
                 raise e
             return None, None
         else:
-            if rec_data[0] != GbnConfig.SYNC_FLAG[0]:
+            if size and self.receive_buffer[0] not in (GbnConfig.SYNC_FLAG[0], GbnConfig.PROBE_FLAG[0],
+                                                       GbnConfig.RESUME_FLAG[0]):
                 self.receive_count += 1
-            return rec_data, rec_addr
+            return self.receive_view[:size], rec_addr
 
     def clear_send_count(self):
         """
@@ -108,11 +307,22 @@ class UDPCommunication:
         """
         self.receive_count = 0
 
+    def report_drop(self):
+        """
+        Print the counts of datagrams dropped by the kernel if any.
+        :return:
+        """
+        if self.send_drop_count or self.kernel_drop_count:
+            GbnConfig.print(f"[WARNING] Datagrams dropped by the kernel: {self.send_drop_count} sent, "
+                            f"{self.kernel_drop_count} received.")
+
     def close(self):
         """
         Close the UDP socket.
         :return:
         """
+        if self._write_selector is not None:
+            self._write_selector.close()
         self.udp_socket.close()
 
     def __enter__(self):
@@ -128,6 +338,9 @@ class UDPCommunication:
 
 
 class ReceiveThread(threading.Thread):
+    # 无数据时selector的最长等待时间(秒)
+    SELECT_TIMEOUT = 0.5
+
     def __init__(self, udp_handle: UDPCommunication):
         """
         Initialize the reception thread.
@@ -135,7 +348,11 @@ class ReceiveThread(threading.Thread):
         """
         super(ReceiveThread, self).__init__()
         self.udp_handle = udp_handle
+        self.receiver = GbnReceiver(udp_handle, self.deliver_ack, self.deliver_probe, self.deliver_resume,
+                                    self.deliver_sync)
         self._stop_event = threading.Event()
+        # 用于在stop()时立即唤醒阻塞在selector上的接收线程
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
 
     def stop(self):
         """
@@ -143,77 +360,89 @@ class ReceiveThread(threading.Thread):
         :return:
         """
         self._stop_event.set()
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            pass
 
     def run(self):
         """
-        Run the reception thread.
+        Run the reception thread, sleep in the selector until a datagram arrives or stop() is called.
         :return:
         """
-        ack_dict = {}
-        write_handle = FileWriter()
+        selector = selectors.DefaultSelector()
+        selector.register(self.udp_handle.udp_socket, selectors.EVENT_READ)
+        selector.register(self._wakeup_reader, selectors.EVENT_READ)
         GbnConfig.print("[INFO] Receive Thread start listening...")
         while not self._stop_event.is_set():
-            rec_data, rec_addr = self.udp_handle.receive()
-            if rec_addr is None and rec_data is None:
-                continue
-            if rec_data[0] == GbnConfig.SYNC_FLAG[0]:
-                src = MACAddress.from_bytes(rec_data[1:7])
-                dst = MACAddress.from_bytes(rec_data[7:13])
-                if dst == GbnConfig.MAC_ADDRESS:
-                    if src in ack_dict:
-                        ack_dict.pop(src)
-                    GbnConfig.init(reset=True)
-                    GbnConfig.print(f"[WARNING] Reset Config.")
-                continue
-            # 检查CRC纠错码
-            try:
-                # GbnConfig.print(rec_data)
-                rec_frame = FrameFactory.from_bytes(rec_data)
-            except CRCError:
-                GbnLog.receive_log(self.udp_handle.receive_count, -1, -1, "DataErr", "ReceiveError")
-                continue
+            # 有延迟确认时最多等到其到期
+            time_left = self.receiver.time_left
+            selector.select(self.SELECT_TIMEOUT if time_left is None else min(time_left, self.SELECT_TIMEOUT))
+            # 取出缓冲区中所有已到达的数据报
+            while not self._stop_event.is_set():
+                rec_data, rec_addr = self.udp_handle.receive_into()
+                if rec_addr is None and rec_data is None:
+                    break
+                self.receiver.handle(rec_data, rec_addr)
+            self.receiver.poll()
+        selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        self.receiver.close()
+        self.udp_handle.report_drop()
+        GbnConfig.print('[INFO] Receive Thread stopped.')
 
-            # 若非发给本机的包，跳过
-            if rec_frame.dst_mac_addr != GbnConfig.MAC_ADDRESS:
-                GbnLog.receive_log(self.udp_handle.receive_count, -1, -1, "AddrErr", "ReceiveError")
-                continue
-            # 若为数据帧
-            if rec_frame.DATA_FRAME:
-                # 若第一次接收包，登记入接收map中
-                if rec_frame.src_mac_addr not in ack_dict:
-                    ack_dict[rec_frame.src_mac_addr] = GbnConfig.INIT_SEQ_NO
-                # 若接收到的包与要接收的序号相同
-                if rec_frame.seq_num == ack_dict[rec_frame.src_mac_addr]:
-                    # GbnConfig.print(rec_frame.seq_num)
-                    ack_dict[rec_frame.src_mac_addr] = (ack_dict[rec_frame.src_mac_addr] + 1) % (GbnConfig.SW_SIZE + 1)
-                    result, finish_flag = write_handle.write(rec_frame.payload)
-                    GbnLog.receive_log(self.udp_handle.receive_count, rec_frame.seq_num, rec_frame.seq_num,
-                                       pdu_count=result)
-                    if finish_flag is not None:
-                        GbnConfig.print(f"[INFO] file:{finish_flag} receive over!\n")
-                        GbnLog.receive_done(self.udp_handle.receive_count, result, finish_flag, rec_frame.src_mac_addr)
-                        self.udp_handle.clear_receive_count()
-                    ack_frame = AckFrame(src_mac=GbnConfig.MAC_ADDRESS, dst_mac=rec_frame.src_mac_addr,
-                                         ack_num=rec_frame.seq_num)
-                    # 发送确认帧
-                    self.udp_handle.send(ack_frame.frame_bytes, ack=True)
-                else:
-                    GbnLog.receive_log(self.udp_handle.receive_count, ack_dict[rec_frame.src_mac_addr],
-                                       rec_frame.seq_num, "NoErr")
-                    ack_frame = AckFrame(src_mac=GbnConfig.MAC_ADDRESS, dst_mac=rec_frame.src_mac_addr,
-                                         ack_num=(ack_dict[rec_frame.src_mac_addr] + GbnConfig.SW_SIZE) % (
-                                                 GbnConfig.SW_SIZE + 1))
-                    self.udp_handle.send(ack_frame.frame_bytes, ack=True)
-                    continue
-                # if rec_frame.payload == GbnConfig.FILE_END_FLAG:
-                #     ack_dict.pop(rec_frame.src_mac_addr)
-            # 若为确认帧
-            else:
-                GbnLog.receive_log(self.udp_handle.receive_count, -1, rec_frame.seq_num, "OK", "ReceiveACK")
-                with ack_get_dict_lock:
-                    ack_get_dict[rec_frame.src_mac_addr] = rec_frame.seq_num
+    @staticmethod
+    def deliver_ack(src_mac: MACAddress, ack_num: int, nak: bool = False):
+        """
+        Hand a received ACK to the send session of its source.
+        :param src_mac:
+        :param ack_num:
+        :param nak: whether it is a NAK
+        :return:
+        """
+        with ack_channel_dict_lock:
+            ack_channel = ack_channel_dict.get(src_mac)
+        if ack_channel is not None:
+            ack_channel.put(ack_num, nak)
 
-        GbnConfig.print('[INFO] Receive Thread stopped.')
+    @staticmethod
+    def deliver_probe(src_mac: MACAddress, size: int):
+        """
+        Hand the reply of a probe frame to the send session of its source.
+        :param src_mac:
+        :param size:
+        :return:
+        """
+        with ack_channel_dict_lock:
+            ack_channel = ack_channel_dict.get(src_mac)
+        if ack_channel is not None:
+            ack_channel.put_probe(size)
+
+    @staticmethod
+    def deliver_resume(src_mac: MACAddress, offset_list: list):
+        """
+        Hand the reply of a resume query to the send session of its source.
+        :param src_mac:
+        :param offset_list:
+        :return:
+        """
+        with ack_channel_dict_lock:
+            ack_channel = ack_channel_dict.get(src_mac)
+        if ack_channel is not None:
+            ack_channel.put_resume(offset_list)
+
+    @staticmethod
+    def deliver_sync(src_mac: MACAddress):
+        """
+        Hand the reply of a SYNC frame to the send session of its source.
+        :param src_mac:
+        :return:
+        """
+        with ack_channel_dict_lock:
+            ack_channel = ack_channel_dict.get(src_mac)
+        if ack_channel is not None:
+            ack_channel.put_sync()
 
 
 class SendThread:
@@ -222,8 +451,6 @@ class SendThread:
         Initialize the send thread.
         :param udp_handle:
         """
-        self.window = None
-        self.ack_send_dict = None
         self.udp_handle = udp_handle
         self.rec_thread = ReceiveThread(udp_handle)
 
@@ -235,8 +462,6 @@ class SendThread:
         self.rec_thread.start()
         while True:
             self.udp_handle.send_count = 0
-            with ack_get_dict_lock:
-                ack_get_dict.clear()
             if not GbnConfig.TEST_MODE:
                 message = input("[INPUT] Please input the destination MAC address , or input 0 to exit:")
 
@@ -249,7 +474,8 @@ class SendThread:
                 except ValueError:
                     GbnConfig.print("[WARNING] Invalid Mac Address!")
                     continue
-                message = input("[INPUT] Please input the file to send , or input 0 to exit:")
+                message = input(
+                    "[INPUT] Please input the file to send (several files separated by ';'), or input 0 to exit:")
                 if message == '0':
                     self.rec_thread.stop()
                     self.rec_thread.join()
@@ -259,94 +485,39 @@ class SendThread:
                 GbnConfig.print(f"[INFO] Destination MAC Address(from config):{str(dst_mac)}")
                 message = GbnConfig.FILE_PATH
                 GbnConfig.print(f"[INFO] File Path(from config):{message}")
-            self.window = GbnWindows(dst_mac)
-
             try:
-                file_handle = FileReader(message)
+                file_handle = FileReader(*message.split(';'))
             except FileNotFoundError:
                 GbnConfig.print("[ERROR] Invalid File Name.")
                 if GbnConfig.TEST_MODE:
                     return 0
                 continue
+            session = new_send_session(self.udp_handle, dst_mac, file_handle)
 
-            sync_byte: bytes = GbnConfig.SYNC_FLAG + GbnConfig.MAC_ADDRESS.to_bytes() + dst_mac.to_bytes()
-            self.udp_handle.send(sync_byte, False)
-
-            self.window.bind_file(file_handle)
-            seq = self.window.begin_point
-            while not self.window.if_end:
-                # 判断ack表，移动窗口
-                with ack_get_dict_lock:
-                    ack_get = ack_get_dict.copy()
-                for key, value in ack_get.items():
-                    if key == dst_mac:
-                        dis_1 = (seq + GbnConfig.SW_SIZE + 1 - self.window.unused_point) % (GbnConfig.SW_SIZE + 1)
-                        dis_2 = (value + GbnConfig.SW_SIZE + 1 - self.window.unused_point) % (GbnConfig.SW_SIZE + 1)
-                        self.window.slide(value)
-                        # 若窗口滑动前seq在窗口中位置比ack靠前，则将seq置ack后一窗口位置
-                        if not self.window.check and dis_1 <= dis_2:
-                            seq = self.window.begin_point
-                # 超时
-                if not self.window.check:
-                    # 将所有非超时重传置为RT
-                    tmp_point = (self.window.begin_point + 1) % (GbnConfig.SW_SIZE + 1)
-                    while tmp_point != seq:
-                        self.window.set_status(tmp_point, "RT")
-                        tmp_point = (tmp_point + 1) % (GbnConfig.SW_SIZE + 1)
-                    seq = self.window.begin_point
-                if seq == self.window.unused_point:
-                    continue
-                # 发送数据帧
-                if not self.window.if_end or seq != self.window.file_end_point:
-                    # GbnConfig.print(self.window.get_data(seq))
-                    self.udp_handle.send(self.window.get_data(seq))
-                    GbnLog.send_log(self.udp_handle.send_count, seq,
-                                    self.window.get_status(seq), self.window.unused_point)
-                    self.window.set_status(seq)
-                    self.window.start_timing(seq)
-                    seq = (seq + 1) % (GbnConfig.SW_SIZE + 1)
-
-            # GbnConfig.print("_______________")
-            tmp_end_flag = False
-            while True:
-                with ack_get_dict_lock:
-                    ack_get = ack_get_dict.copy()
-                for key, value in ack_get.items():
-                    if key == dst_mac:
-                        if value == (self.window.file_end_point + GbnConfig.SW_SIZE) % (GbnConfig.SW_SIZE + 1):
-                            tmp_end_flag = True
-                            break
-                        dis_1 = (seq + GbnConfig.SW_SIZE + 1 - self.window.unused_point) % (GbnConfig.SW_SIZE + 1)
-                        dis_2 = (value + GbnConfig.SW_SIZE + 1 - self.window.unused_point) % (GbnConfig.SW_SIZE + 1)
-                        self.window.slide(value)
-                        # 若窗口滑动前seq在窗口中位置比ack靠前，则将seq置ack后一窗口位置
-                        if not self.window.check and dis_1 <= dis_2:
-                            seq = self.window.begin_point
-                if tmp_end_flag:
-                    break
-                # 超时
-                if not self.window.check:
-                    # 将所有非超时重传置为RT
-                    tmp_point = (self.window.begin_point + 1) % (GbnConfig.SW_SIZE + 1)
-                    while tmp_point != seq:
-                        self.window.set_status(tmp_point, "RT")
-                        tmp_point = (tmp_point + 1) % (GbnConfig.SW_SIZE + 1)
-                    seq = self.window.begin_point
-                if seq == self.window.unused_point:
-                    continue
-                # 发送数据帧
-
-                # TODO:
-                if seq != self.window.file_end_point:
-                    # GbnConfig.print(self.window.get_data(seq))
-                    self.udp_handle.send(self.window.get_data(seq))
-                    GbnLog.send_log(self.udp_handle.send_count, seq,
-                                    self.window.get_status(seq), self.window.unused_point)
-                    self.window.set_status(seq)
-                    self.window.start_timing(seq)
-                    seq = (seq + 1) % (GbnConfig.SW_SIZE + 1)
-            GbnLog.send_done(self.udp_handle.send_count, self.window.send_count, file_handle.file_path, dst_mac)
-            self.window.close_pbar()
+            # 选择重传需要逐个处理每一个确认
+            # 快速重传需统计每个重复ack，不能合并
+            ack_channel = AckChannel(
+                cumulative=GbnConfig.ARQ_MODE == GbnConfig.ARQ_GBN and GbnConfig.DUP_ACK_THRESHOLD == 0)
+            with ack_channel_dict_lock:
+                ack_channel_dict[dst_mac] = ack_channel
+
+            session.start()
+            while not session.finished:
+                # 发出窗口允许的所有帧后，等待ack直到窗口首帧超时
+                session.pump()
+                # 收到ack，移动窗口
+                for ack_num, nak in ack_channel.get(session.time_left):
+                    session.on_ack(ack_num, nak)
+                for size in ack_channel.get_probe():
+                    session.on_probe(size)
+                for offset_list in ack_channel.get_resume():
+                    session.on_resume(offset_list)
+                if ack_channel.get_sync():
+                    session.on_sync()
+
+            with ack_channel_dict_lock:
+                ack_channel_dict.pop(dst_mac, None)
+            session.close()
             self.udp_handle.clear_send_count()
             GbnConfig.print(f"[INFO] File:{message} Send Finish!")
 
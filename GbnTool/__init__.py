@@ -12,14 +12,23 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
+import array
+import asyncio
 import binascii
+import ctypes
 import re
 import configparser
 import math
+import mmap
 import crcmod
+import zlib
 import os
 import socket
+import sys
+import selectors
 import itertools
+import heapq
+import queue
 import threading
 import random
 import errno
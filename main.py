@@ -13,8 +13,13 @@
 #     limitations under the License.
 
 from GbnTool.UdpTool import *
+from GbnTool import asyncio
+from GbnTool.AsyncTool import GbnAsyncEngine
 
-if __name__ == '__main__':
+if __name__ == '__main__' and GbnConfig.ENGINE == "asyncio":
+    # 以asyncio引擎运行
+    asyncio.run(GbnAsyncEngine().run())
+elif __name__ == '__main__':
     # 设置本地端口
     udp_handle = UDPCommunication(GbnConfig.UDP_PORT)
     # 设置目标的 IP 和端口